@@ -0,0 +1,67 @@
+import logsetup as ls
+import settings
+import api
+
+from time import monotonic
+
+
+class AccountState:
+
+    def __init__(self):
+        try:
+            self.ttlSeconds = float(settings.getenv('ACCOUNT_CACHE_TTL_SECONDS'))
+            self.reservedCost = float(0)
+            self.refresh()
+        except:
+            ls.log.exception("AccountState.__init__")
+
+
+    def refresh(self):
+        try:
+            accountInformation = api.getAccountInformation()
+            self.equity = float(accountInformation.equity)
+            self.cash = float(accountInformation.cash)
+            self.longMarketValue = float(accountInformation.long_market_value)
+            self.refreshedAt = monotonic()
+
+            ls.log.debug({'equity': self.equity, 'cash': self.cash, 'longMarketValue': self.longMarketValue})
+        except:
+            ls.log.exception("AccountState.refresh")
+
+
+    def current(self):
+        try:
+            if monotonic() - self.refreshedAt > self.ttlSeconds:
+                self.refresh()
+
+            # open orders are not reflected in the account until they fill, so reserved cost is counted as already spent
+            return {
+                        'equity': self.equity,
+                        'cash': self.cash - self.reservedCost,
+                        'longMarketValue': self.longMarketValue + self.reservedCost
+            }
+        except:
+            ls.log.exception("AccountState.current")
+
+
+    def reserve(self, orderCost):
+        try:
+            self.reservedCost += orderCost
+        except:
+            ls.log.exception("AccountState.reserve")
+
+
+    def clearReservations(self):
+        try:
+            self.reservedCost = float(0)
+        except:
+            ls.log.exception("AccountState.clearReservations")
+
+
+    def applyFill(self, orderSide, quantity, fillPrice):
+        try:
+            fillValue = float(quantity) * float(fillPrice)
+            self.cash += -fillValue if orderSide == 'buy' else fillValue
+            self.longMarketValue += fillValue if orderSide == 'buy' else -fillValue
+        except:
+            ls.log.exception("AccountState.applyFill")
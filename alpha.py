@@ -2,37 +2,42 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
-import uuid
+import multiprocessing
+
 from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from time import sleep
 
 import logsetup as ls
+import settings
 import timekeeper as tk
 import database as db
+import strategy
+import performance
+import instrumentation
 import api
+import partition
 
-from asset import Asset
-from time import sleep
+from evaluator import evaluateAssets
+from positionbook import PositionBook
+from account import AccountState
+from streaming import StreamingEvaluator
 
 
-def main():
+def main(persistentStream=False):
 
     try:
         ls.log.info("BEGIN")
+        instrumentation.reset()
 
-        weekDayCondition = tk.weekDay != 5 and tk.weekDay != 6
-        marketClock = api.getMarketClock()
-        marketOpenCondition = marketClock.is_open
-        currentHour = tk.hour
-        marketOpeningTimeCondition = atTheOpen = currentHour == 9
-        marketClosingTimeCondition = currentHour == (marketClock.next_close.hour - 1)
-        runUnconditionally = os.getenv('RUN_UNCONDITIONALLY') == 'True'
-        paperAccount = os.getenv('PAPER_ACCOUNT') == 'True'
+        runConditionsMet, atTheOpen = getRunConditions()
+        paperAccount = settings.getenv('PAPER_ACCOUNT') == 'True'
 
-        if (weekDayCondition and marketOpenCondition and (marketOpeningTimeCondition or marketClosingTimeCondition)) or runUnconditionally:
+        if runConditionsMet:
 
-            buyEnabled = os.getenv('BUY_ENABLED') == 'True'
-            sellEnabled = os.getenv('SELL_ENABLED') == 'True'
-            ordersEnabled = os.getenv('ORDERS_ENABLED') == 'True'
+            buyEnabled = settings.getenv('BUY_ENABLED') == 'True'
+            sellEnabled = settings.getenv('SELL_ENABLED') == 'True'
+            ordersEnabled = settings.getenv('ORDERS_ENABLED') == 'True'
 
             logData = {
                         'buyEnabled': buyEnabled,
@@ -42,79 +47,36 @@ def main():
             }
 
             ls.log.info(logData)
+
+            # connecting here means a database outage ends the run before any order is placed
+            db.getPool()
             
-            symbolList = os.getenv('TICKERS').split(',')
+            symbolList = settings.getenv('TICKERS').split(',')
+            assetCache = {}
 
-            pool = ThreadPoolExecutor(1)
-            pool.submit(api.startLiveDataStream)
-            sleep(5)
+            if not persistentStream:
+                pool = ThreadPoolExecutor(1)
+                pool.submit(api.startLiveDataStream)
 
             try:
 
+                positionBook = PositionBook()
+                accountState = AccountState()
+
                 #sell
                 if sellEnabled:
 
                     ls.log.info("SELL PHASE")
 
-                    distinctSymbolsEligibleForSale = getDistinctSymbolsEligibleForSale()
-                    for record in distinctSymbolsEligibleForSale:
-                        symbol = record[0]
+                    sellSymbols = positionBook.symbols()
+                    for symbol in sellSymbols:
                         api.subscribeLiveData(symbol)
 
-                    sleep(int(os.getenv('WAIT_FOR_LIVE_DATA_SECONDS')))
+                    api.waitForLiveData(sellSymbols, int(settings.getenv('WAIT_FOR_LIVE_DATA_SECONDS')))
 
-                    accountInformation = api.getAccountInformation()
-                    cash = float(accountInformation.cash)
-                    positions = getOpenPositionsEligibleForSale()
-                    rsiPeriodDictionary = getRsiPeriods()
-                    
-                    for position in positions:
-
-                        tableRecordID = position[0]
-                        symbol = position[1]
-                        quantity = float(str(position[2]))
-                        purchaseDate = position[3]
-                        purchasePrice = float(position[4])
-                        dayTradeLimitCheck = dayTradeCheck()
-
-                        elapsedTimeSellCondition = purchaseDate < tk.formattedDate or dayTradeLimitCheck
-
-                        if elapsedTimeSellCondition:
-
-                            rsiPeriod = rsiPeriodDictionary['sell']
-                            asset = Asset(symbol, rsiPeriod, atTheOpen)
-                            limitPriceSell = asset.limitPriceSell
-                            percentUpDown = asset.percentUpDown
-                            rsi = asset.rsi
-
-                            convertedPurchaseDate = tk.stringToDate(purchaseDate)
-                            sellSideMarginMinimum = float(os.getenv('SELL_SIDE_MARGIN_MINIMUM'))
-                            marginInterestRate = float(os.getenv('MARGIN_INTEREST_RATE'))
-                            marginInterestCoverage = 0 if cash >= 0 else tk.dateDiff(convertedPurchaseDate, tk.currentDate) * (marginInterestRate / 360)
-                            rsiUpper = int(os.getenv('RSI_UPPER'))
-
-                            percentUpDownCondition = percentUpDown > 0
-                            rsiSellCondition = rsi >= rsiUpper
-                            profitMarginSellCondition = ((limitPriceSell / purchasePrice) - 1) >= (sellSideMarginMinimum + marginInterestCoverage)
-
-                            standardSellScenario = percentUpDownCondition and profitMarginSellCondition and rsiSellCondition
-                            dayTradeSellScenario = purchaseDate == tk.formattedDate and profitMarginSellCondition
-                            negativeCashSellScenario = cash <= 0 and profitMarginSellCondition
-
-                            if standardSellScenario or dayTradeSellScenario or negativeCashSellScenario:
-                                
-                                ls.log.debug("Sell conditions met.")
-
-                                if ordersEnabled:
-                                    orderID = api.submitOrder(symbol, quantity, limitPriceSell, 'sell')
-                                    orderFilled = api.orderFilled(orderID)
-                                    
-                                    if orderFilled:
-                                        salePrice = api.getFilledOrderAveragePrice(orderID)
-                                        updateSoldPosition(tableRecordID, salePrice, orderID)
-
-                    for record in distinctSymbolsEligibleForSale:
-                        symbol = record[0]
+                    sellPositions(sellSymbols, positionBook, accountState, atTheOpen, assetCache, ordersEnabled)
+
+                    for symbol in sellSymbols:
                         api.unSubscribeLiveData(symbol)
 
                 #buy
@@ -125,53 +87,27 @@ def main():
                     for symbol in symbolList:
                         api.subscribeLiveData(symbol)
 
-                    sleep(int(os.getenv('WAIT_FOR_LIVE_DATA_SECONDS')))
-
-                    rsiPeriodDictionary = getRsiPeriods()
-
-                    for symbol in symbolList:                        
-                        rsiPeriod = rsiPeriodDictionary['buy']
-                        asset = Asset(symbol, rsiPeriod, atTheOpen)
-                        rsi = asset.rsi
-                        percentUpDown = asset.percentUpDown
-                        limitPriceBuy = asset.limitPriceBuy
-                        rsiLower = int(os.getenv('RSI_LOWER'))
-
-                        if percentUpDown <= 0 and rsi <= rsiLower:
-                            
-                            ls.log.debug("Buy conditions met.")
-                            quantity = getBuyOrderQuantity(limitPriceBuy)
-                                
-                            if quantity > 0 and ordersEnabled:
-                                orderID = api.submitOrder(symbol, quantity, limitPriceBuy, 'buy')
-                                orderFilled = api.orderFilled(orderID)
-                                
-                                if orderFilled:
-                                    purchasePrice = api.getFilledOrderAveragePrice(orderID)
-                                    insertBuyRecord(symbol, quantity, purchasePrice, orderID)
+                    api.waitForLiveData(symbolList, int(settings.getenv('WAIT_FOR_LIVE_DATA_SECONDS')))
 
+                    buyCandidates = getBuyCandidates(symbolList, accountState, atTheOpen, assetCache)
+
+                    for symbol in symbolList:
                         api.unSubscribeLiveData(symbol)
 
+                    buyAssets(buyCandidates, positionBook, accountState, ordersEnabled)
+
                 #performance reporting
                 if not paperAccount:
-                    oneYearReturn = getOneYearReturn()
-                    oneYearBenchmarkReturn = getOneYearBenchmarkReturn()
-                    oneYearVariance = float('%.6f' % (oneYearReturn - oneYearBenchmarkReturn))
-
-                    ls.log.info(
-                                    {
-                                        'oneYearPerformance': oneYearReturn,
-                                        'oneYearBenchmark': oneYearBenchmarkReturn,
-                                        'oneYearVariance': oneYearVariance
-                                    }
-                                )
+                    performance.update()
+                    ls.log.info(performance.getReport())
 
             except:
                 ls.log.exception("alpha.main inner")
             
             finally:
-                api.stopLiveDataStream()
-                pool.shutdown()
+                if not persistentStream:
+                    api.stopLiveDataStream()
+                    pool.shutdown()
 
         else:
             ls.log.info("Run conditions not met. Today is a weekend day, the market is not open, or the market is not closing in the next hour.")
@@ -180,198 +116,628 @@ def main():
         ls.log.exception("alpha.main")
     
     finally:
+        instrumentation.emitReport()
         ls.log.info("END")
 
-        
-def getBuyOrderQuantity(limitPrice):
+
+def getRunConditions():
     try:
-        enduranceDays = int(os.getenv('ENDURANCE_DAYS'))
+        weekDayCondition = tk.weekDay != 5 and tk.weekDay != 6
+        # weekends are ruled out from the local clock alone, the market clock is only fetched on weekdays and then cached
+        marketClock = api.getMarketClock() if weekDayCondition else None
+        marketOpenCondition = marketClock is not None and marketClock['is_open']
+        currentHour = tk.hour
+        marketOpeningTimeCondition = atTheOpen = currentHour == 9
+        marketClosingTimeCondition = marketClock is not None and currentHour == (marketClock['next_close'].hour - 1)
+        runUnconditionally = settings.getenv('RUN_UNCONDITIONALLY') == 'True'
 
-        accountInformation = api.getAccountInformation()
-        equity = float(accountInformation.equity)
-        longMarketValue = float(accountInformation.long_market_value)
-        cash = float(accountInformation.cash)
+        runConditionsMet = (weekDayCondition and marketOpenCondition and (marketOpeningTimeCondition or marketClosingTimeCondition)) or runUnconditionally
 
-        activeMarginPercentage = float(os.getenv('ACTIVE_MARGIN_PERCENTAGE'))
-        activeCapital = equity * (1 + activeMarginPercentage)
-        theoreticalOrderCost = activeCapital / enduranceDays
-        activeBuyingPower = activeCapital - longMarketValue
+        return runConditionsMet, atTheOpen
+    except:
+        ls.log.exception("alpha.getRunConditions")
+        return False, False
+
+
+def runAccounts():
+    try:
+        ls.log.info("ACCOUNTS BEGIN")
+        instrumentation.reset()
+
+        accounts = settings.loadAccounts()
+        runConditionsMet, atTheOpen = getRunConditions()
+
+        if runConditionsMet and accounts:
+
+            ls.log.info({'accounts': [name for name, overrides in accounts], 'atTheOpen': atTheOpen})
+
+            pool = ThreadPoolExecutor(1)
+            pool.submit(api.startLiveDataStream)
+
+            try:
+                with ThreadPoolExecutor(len(accounts)) as accountPool:
+
+                    books = list(accountPool.map(lambda account: settings.runAs(account[0], account[1], loadAccountBooks), accounts))
+
+                    # one subscription and one snapshot cover every account's tickers and open lots, so a new account only adds order traffic
+                    sharedSymbols = list(dict.fromkeys(symbol for book in books if book is not None for symbol in book['symbols']))
+                    for symbol in sharedSymbols:
+                        api.subscribeLiveData(symbol)
+
+                    api.waitForLiveData(sharedSymbols, int(settings.getenv('WAIT_FOR_LIVE_DATA_SECONDS')))
+                    snapshot = api.getMarketDataSnapshot(sharedSymbols)
+
+                    list(accountPool.map(lambda account, book: settings.runAs(account[0], account[1], tradeAccount, book, atTheOpen, snapshot), accounts, books))
+
+                    for symbol in sharedSymbols:
+                        api.unSubscribeLiveData(symbol)
+
+            finally:
+                api.stopLiveDataStream()
+                pool.shutdown()
 
-        if (activeBuyingPower / theoreticalOrderCost) > 0:
-            orderQuantity = int(theoreticalOrderCost / limitPrice)
-            
         else:
-            orderQuantity = int(activeBuyingPower / limitPrice)
-            orderQuantity = orderQuantity if orderQuantity > 0 else 0
-
-        if activeMarginPercentage <= 0:
-            estimatedOrderCost = orderQuantity * limitPrice
-            orderQuantity = orderQuantity if cash >= estimatedOrderCost else 0
-
-        ls.log.debug(
-                        {
-                            'equity': equity,
-                            'longMarketValue': longMarketValue,
-                            'activeMarginPercentage': activeMarginPercentage,
-                            'activeCapital': activeCapital,
-                            'theoreticalOrderCost': theoreticalOrderCost,
-                            'activeBuyingPower': activeBuyingPower,
-                            'limitPrice': limitPrice,
-                            'orderQuantity': orderQuantity        
-                        }
-                    )
-
-        return orderQuantity
+            ls.log.info("Run conditions not met or no accounts configured in ACCOUNT_ENV_FILES.")
+
+    except:
+        ls.log.exception("alpha.runAccounts")
+
+    finally:
+        instrumentation.emitReport()
+        ls.log.info("ACCOUNTS END")
+
+
+def loadAccountBooks():
+    try:
+        db.getPool()
+        positionBook = PositionBook()
+        accountState = AccountState()
+
+        book = {
+                    'positionBook': positionBook,
+                    'accountState': accountState,
+                    'symbols': settings.getenv('TICKERS').split(',') + positionBook.symbols()
+        }
+
+        return book
     except:
-        ls.log.exception("alpha.getBuyOrderQuantity")
+        ls.log.exception("alpha.loadAccountBooks")
 
 
-def insertBuyRecord(symbol, quantity, purchasePrice, orderID):
+def tradeAccount(book, atTheOpen, snapshot):
     try:
-        tableRecordID = str(uuid.uuid4())
-        query = "INSERT INTO " + db.dbTableName + " (id, symbol, quantity, purchasedate, purchaseprice, purchaseorderid) VALUES (%s, %s, %s, %s, %s, %s)"
-        values = (tableRecordID, symbol, quantity, tk.formattedDate, purchasePrice, orderID)
-        db.runQuery(query, values)
+        if book is None:
+            return
+
+        buyEnabled = settings.getenv('BUY_ENABLED') == 'True'
+        sellEnabled = settings.getenv('SELL_ENABLED') == 'True'
+        ordersEnabled = settings.getenv('ORDERS_ENABLED') == 'True'
+        positionBook = book['positionBook']
+        accountState = book['accountState']
+
+        ls.log.info({'buyEnabled': buyEnabled, 'sellEnabled': sellEnabled, 'ordersEnabled': ordersEnabled})
+
+        # asset results depend on the account's limit, spread and rsi settings, so each account keeps its own cache
+        if sellEnabled:
+            sellPositions(positionBook.symbols(), positionBook, accountState, atTheOpen, {}, ordersEnabled, snapshot)
+
+        if buyEnabled:
+            buyCandidates = getBuyCandidates(settings.getenv('TICKERS').split(','), accountState, atTheOpen, {}, snapshot)
+            buyAssets(buyCandidates, positionBook, accountState, ordersEnabled)
+
+        if settings.getenv('PAPER_ACCOUNT') != 'True':
+            performance.update()
+            ls.log.info(performance.getReport())
     except:
-        ls.log.exception("alpha.insertBuyRecord")
+        ls.log.exception("alpha.tradeAccount")
 
 
-def updateSoldPosition(tableRecordID, salePrice, sellOrderID):
+def sellPositions(sellSymbols, positionBook, accountState, atTheOpen, assetCache, ordersEnabled, snapshot=None):
     try:
-        query = "UPDATE " + db.dbTableName + " SET saledate = %s, saleprice = %s, saleorderid = %s WHERE id = %s"
-        values = (tk.formattedDate, salePrice, sellOrderID, tableRecordID)
-        db.runQuery(query, values)
+        cash = accountState.current()['cash']
+        rsiPeriodDictionary = getRsiPeriods(accountState)
+        snapshot = snapshot if snapshot is not None else api.getMarketDataSnapshot(sellSymbols)
+        assets = evaluateAssets(sellSymbols, rsiPeriodDictionary['sell'], atTheOpen, snapshot, assetCache)
+
+        parameters = strategy.loadParameters()
+        sellOrders = []
+        pendingDayTrades = 0
+
+        for symbol, asset in zip(sellSymbols, assets):
+
+            limitPriceSell = asset.limitPriceSell
+
+            for position in positionBook.lots(symbol):
+
+                tableRecordID = position[0]
+                quantity = float(str(position[2]))
+                purchaseDate = position[3]
+                purchasePrice = float(position[4])
+                dayTradeLimitCheck = positionBook.dayTradeAllowed(pendingDayTrades)
+
+                elapsedTimeSellCondition = purchaseDate < tk.formattedDate or dayTradeLimitCheck
+
+                if not elapsedTimeSellCondition:
+                    continue
+
+                daysHeld = tk.dateDiff(tk.stringToDate(purchaseDate), tk.currentDate)
+                boughtToday = purchaseDate == tk.formattedDate
+
+                if strategy.sellConditionsMet(asset.percentUpDown, asset.rsi, limitPriceSell, purchasePrice, daysHeld, boughtToday, cash, parameters):
+                    
+                    ls.log.debug("Sell conditions met.")
+                    sellOrders.append((tableRecordID, symbol, quantity, limitPriceSell))
+                    pendingDayTrades += 1 if boughtToday else 0
+
+        if ordersEnabled and sellOrders:
+            orderIDs = api.submitOrders([(symbol, quantity, limitPrice, 'sell') for tableRecordID, symbol, quantity, limitPrice in sellOrders])
+            fills = api.awaitOrderFills(orderIDs)
+
+            for sellOrder, orderID in zip(sellOrders, orderIDs):
+                if fills.get(orderID) is not None:
+                    fillPrice, filledQuantity = fills[orderID]
+                    positionBook.recordSale(sellOrder[0], fillPrice, orderID, filledQuantity)
+                    accountState.applyFill('sell', filledQuantity, fillPrice)
+
+            positionBook.flush()
     except:
-        ls.log.exception("alpha.updateSoldPosition")
+        ls.log.exception("alpha.sellPositions")
 
 
-def getOpenPositionsEligibleForSale():
+def getBuyCandidates(symbolList, accountState, atTheOpen, assetCache, snapshot=None):
     try:
-        query = "SELECT id, symbol, quantity, purchasedate, purchaseprice FROM " + db.dbTableName + " WHERE ISNULL(saleorderid) AND ISNULL(saledate) AND ISNULL(saleprice)"
-        positions = db.runQueryAndReturnResults(query, ())
-        return positions
+        rsiPeriodDictionary = getRsiPeriods(accountState)
+        return selectBuyCandidates(symbolList, rsiPeriodDictionary['buy'], atTheOpen, assetCache, snapshot)
     except:
-        ls.log.exception("alpha.getOpenPositionsEligibleForSale")
+        ls.log.exception("alpha.getBuyCandidates")
+        return []
 
 
-def getDistinctSymbolsEligibleForSale():
+def selectBuyCandidates(symbolList, rsiPeriod, atTheOpen, assetCache, snapshot=None):
     try:
-        query = "SELECT DISTINCT symbol FROM " + db.dbTableName + " WHERE ISNULL(saleorderid) AND ISNULL(saledate) AND ISNULL(saleprice)"
-        symbols = db.runQueryAndReturnResults(query, ())
-        return symbols
+        snapshot = snapshot if snapshot is not None else api.getMarketDataSnapshot(symbolList)
+        assets = evaluateAssets(symbolList, rsiPeriod, atTheOpen, snapshot, assetCache)
+
+        parameters = strategy.loadParameters()
+        buyCandidates = []
+
+        for symbol, asset in zip(symbolList, assets):
+            if strategy.buyConditionsMet(asset.percentUpDown, asset.rsi, parameters):
+                ls.log.debug("Buy conditions met.")
+                buyCandidates.append((symbol, asset.limitPriceBuy, asset.rsi))
+
+        return buyCandidates
     except:
-        ls.log.exception("alpha.getDistinctSymbolsEligibleForSale")
+        ls.log.exception("alpha.selectBuyCandidates")
+        return []
 
 
-def dayTradeCheck():
+def buyAssets(buyCandidates, positionBook, accountState, ordersEnabled):
     try:
-        query = "SELECT COUNT(*) FROM " + db.dbTableName + " WHERE purchasedate >= %s AND purchasedate = saledate"
-        count = db.runQueryAndReturnResults(query, (tk.todayMinus5DaysFormatted,))
-        result = count[0][0] <= 3
-        return result
+        buyOrders = []
+        quantities = getBuyOrderQuantities([candidate[1] for candidate in buyCandidates], [candidate[2] for candidate in buyCandidates], accountState) if buyCandidates else []
+
+        for (symbol, limitPriceBuy, rsi), quantity in zip(buyCandidates, quantities):
+            if quantity > 0:
+                buyOrders.append((symbol, quantity, limitPriceBuy, 'buy'))
+                accountState.reserve(quantity * limitPriceBuy)
+
+        if ordersEnabled and buyOrders:
+            orderIDs = api.submitOrders(buyOrders)
+            fills = api.awaitOrderFills(orderIDs)
+
+            for buyOrder, orderID in zip(buyOrders, orderIDs):
+                if fills.get(orderID) is not None:
+                    fillPrice, filledQuantity = fills[orderID]
+                    positionBook.recordPurchase(buyOrder[0], filledQuantity, fillPrice, orderID)
+                    accountState.applyFill('buy', filledQuantity, fillPrice)
+
+            positionBook.flush()
+
+        accountState.clearReservations()
     except:
-        ls.log.exception("alpha.dayTradeCheck")
+        ls.log.exception("alpha.buyAssets")
 
 
-def getRsiPeriods():
+def runDaemon():
     try:
-        accountInformation = api.getAccountInformation()
-        equity = float(accountInformation.equity)
-        longMarketValue = float(accountInformation.long_market_value)
-        activeMarginPercentage = float(os.getenv('ACTIVE_MARGIN_PERCENTAGE'))
-        activeCapital = equity * (1 + activeMarginPercentage)
-        capitalUtilization = longMarketValue / activeCapital
-
-        rsiPeriodLower = int(os.getenv('RSI_PERIOD_LOWER'))
-        rsiPeriodUpper = int(os.getenv('RSI_PERIOD_UPPER'))
-
-        if rsiPeriodLower > rsiPeriodUpper:
-            raise Exception("RSI period lower must be less than or equal to RSI period upper.")
-
-        rsiRange = range(rsiPeriodLower, rsiPeriodUpper + 1)
-        rsiRangeLength = len(rsiRange)
-
-        utzSegmentSize = 1 / rsiRangeLength
-        currentUtzTestValue = utzSegmentSize
-        
-        buyRSI = rsiPeriodUpper
-        sellRSI = rsiPeriodLower
-
-        for i in range(rsiRangeLength):
-            if capitalUtilization <= currentUtzTestValue:
-                
-                buyRSI = rsiRange[i]                
-                sellRSI = rsiRange[rsiRangeLength - 1 - i]
-                
-                break
-
-            currentUtzTestValue = currentUtzTestValue + utzSegmentSize
-        
-        rsiDictionary = {'buy': buyRSI, 'sell': sellRSI}
-        
-        return rsiDictionary
+        ls.log.info("DAEMON START")
+
+        pool = ThreadPoolExecutor(1)
+        pool.submit(api.startLiveDataStream)
+        completedRuns = set()
+
+        try:
+            while True:
+                try:
+                    tk.refresh()
+                    nextRunTime = getNextRunTime(api.getMarketClock(), completedRuns)
+                    waitSeconds = (nextRunTime - tk.currentDateTime).total_seconds()
+
+                    if waitSeconds > 0:
+                        ls.log.info({'nextRunTime': str(nextRunTime)})
+                        sleep(waitSeconds)
+                        continue
+
+                    db.ensureConnection()
+                    main(persistentStream=True)
+                    completedRuns.add((tk.formattedDate, 'open' if tk.hour == 9 else 'close'))
+                except KeyboardInterrupt:
+                    raise
+                except:
+                    # a transient api or database error costs one cycle, the loop backs off and reads the clock again
+                    ls.log.exception("alpha.runDaemon cycle")
+                    sleep(int(settings.getenv('DAEMON_RETRY_SECONDS')))
+
+        finally:
+            api.stopLiveDataStream()
+            pool.shutdown()
+
     except:
-        ls.log.exception("alpha.getRsiPeriods")
+        ls.log.exception("alpha.runDaemon")
+
+    finally:
+        ls.log.info("DAEMON STOP")
+
+
+def runStream():
+    try:
+        ls.log.info("STREAM START")
+
+        pool = ThreadPoolExecutor(1)
+        pool.submit(api.startLiveDataStream)
+
+        try:
+            while True:
+                try:
+                    tk.refresh()
+                    marketClock = api.getMarketClock()
+
+                    if not marketClock['is_open']:
+                        ls.log.info({'nextRunTime': str(marketClock['next_open'])})
+                        sleep(max(1, (marketClock['next_open'] - tk.currentDateTime).total_seconds()))
+                        continue
+
+                    db.ensureConnection()
+                    streamSession(marketClock['next_close'])
+
+                    # the session stops ahead of the close, the cached clock reads open until then
+                    tk.refresh()
+                    sleep(max(1, (marketClock['next_close'] - tk.currentDateTime).total_seconds() + 60))
+                except KeyboardInterrupt:
+                    raise
+                except:
+                    # a transient api or database error costs one cycle, the loop backs off and reads the clock again
+                    ls.log.exception("alpha.runStream cycle")
+                    sleep(int(settings.getenv('DAEMON_RETRY_SECONDS')))
+
+        finally:
+            api.stopLiveDataStream()
+            pool.shutdown()
+
+    except:
+        ls.log.exception("alpha.runStream")
+
+    finally:
+        ls.log.info("STREAM STOP")
+
+
+def streamSession(sessionClose):
+    try:
+        ls.log.info("STREAM SESSION BEGIN")
+        instrumentation.reset()
+
+        buyEnabled = settings.getenv('BUY_ENABLED') == 'True'
+        sellEnabled = settings.getenv('SELL_ENABLED') == 'True'
+        ordersEnabled = settings.getenv('ORDERS_ENABLED') == 'True'
+        batchSeconds = float(settings.getenv('STREAM_BATCH_SECONDS'))
+        sessionStop = sessionClose - timedelta(minutes=int(settings.getenv('STREAM_CLOSE_LEAD_MINUTES')))
+        maxBuysPerSymbol = int(settings.getenv('STREAM_MAX_BUYS_PER_SYMBOL'))
+        sessionBuys = {}
+
+        positionBook = PositionBook()
+        accountState = AccountState()
+
+        # rsi and percentUpDown state is seeded once from daily bars, after that every trade updates it in constant time
+        watchSymbols = list(dict.fromkeys(settings.getenv('TICKERS').split(',') + positionBook.symbols()))
+        barsData = api.getStockBars(watchSymbols, api.getTradingCalendar()[0].close, tk.nowMinus15Minutes)
+        streamingEvaluator = StreamingEvaluator(barsData, getRsiPeriods(accountState), strategy.loadParameters())
+        streamingEvaluator.setPositions(positionBook, accountState.current()['cash'])
+
+        api.addLiveTradeListener(streamingEvaluator.onTrade)
+        for symbol in watchSymbols:
+            api.subscribeLiveData(symbol)
+
+        try:
+            while tk.currentDateTime < sessionStop:
+                triggered = streamingEvaluator.takeTriggers(batchSeconds)
+                tk.refresh()
+
+                if not (triggered['sell'] or triggered['buy']):
+                    continue
+
+                ls.log.info({'streamTriggers': triggered})
+
+                # triggers only shortlist symbols, the usual snapshot evaluation with spread and price checks decides the orders
+                if sellEnabled and triggered['sell']:
+                    sellPositions(triggered['sell'], positionBook, accountState, False, {}, ordersEnabled)
+
+                # a trigger rearms whenever the price crosses back, so buys per symbol are capped for the session before sizing
+                buySymbols = [symbol for symbol in triggered['buy'] if sessionBuys.get(symbol, 0) < maxBuysPerSymbol]
+                if len(buySymbols) < len(triggered['buy']):
+                    ls.log.info({'streamBuyLimitReached': [symbol for symbol in triggered['buy'] if symbol not in buySymbols]})
+
+                if buyEnabled and buySymbols:
+                    buyCandidates = getBuyCandidates(buySymbols, accountState, False, {})
+                    for symbol, limitPriceBuy, rsi in buyCandidates:
+                        sessionBuys[symbol] = sessionBuys.get(symbol, 0) + 1
+                    buyAssets(buyCandidates, positionBook, accountState, ordersEnabled)
+
+                streamingEvaluator.setRsiPeriods(getRsiPeriods(accountState))
+                streamingEvaluator.setPositions(positionBook, accountState.current()['cash'])
+
+        finally:
+            api.removeLiveTradeListener(streamingEvaluator.onTrade)
+            for symbol in watchSymbols:
+                api.unSubscribeLiveData(symbol)
 
+    except:
+        ls.log.exception("alpha.streamSession")
+
+    finally:
+        instrumentation.emitReport()
+        ls.log.info("STREAM SESSION END")
+
+
+def runPartitioned():
+    try:
+        ls.log.info("PARTITIONED BEGIN")
+        instrumentation.reset()
+
+        runConditionsMet, atTheOpen = getRunConditions()
+        paperAccount = settings.getenv('PAPER_ACCOUNT') == 'True'
+
+        if runConditionsMet:
+
+            buyEnabled = settings.getenv('BUY_ENABLED') == 'True'
+            sellEnabled = settings.getenv('SELL_ENABLED') == 'True'
+            ordersEnabled = settings.getenv('ORDERS_ENABLED') == 'True'
+            workerCount = int(settings.getenv('PARTITION_WORKERS'))
+
+            ls.log.info({'buyEnabled': buyEnabled, 'sellEnabled': sellEnabled, 'ordersEnabled': ordersEnabled, 'atTheOpen': atTheOpen, 'workers': workerCount})
+
+            db.getPool()
+
+            listener = partition.openListener()
+            spawnLocal = listener is not None and settings.getenv('PARTITION_SPAWN_LOCAL') == 'True'
+            workerProcesses = startLocalWorkers(workerCount) if spawnLocal else []
+            workers = partition.acceptWorkers(listener, workerCount, int(settings.getenv('PARTITION_JOIN_SECONDS'))) if listener is not None else {}
+
+            # the coordinator keeps its own stream for open lots and for any shard a worker fails to return
+            pool = ThreadPoolExecutor(1)
+            pool.submit(api.startLiveDataStream)
+
+            try:
+
+                positionBook = PositionBook()
+                accountState = AccountState()
+
+                #sell
+                if sellEnabled:
+
+                    ls.log.info("SELL PHASE")
+
+                    sellSymbols = positionBook.symbols()
+                    for symbol in sellSymbols:
+                        api.subscribeLiveData(symbol)
+
+                    api.waitForLiveData(sellSymbols, int(settings.getenv('WAIT_FOR_LIVE_DATA_SECONDS')))
+
+                    sellPositions(sellSymbols, positionBook, accountState, atTheOpen, {}, ordersEnabled)
+
+                    for symbol in sellSymbols:
+                        api.unSubscribeLiveData(symbol)
+
+                #buy
+                if buyEnabled:
+
+                    ls.log.info("BUY PHASE")
+
+                    buyCandidates = getPartitionedBuyCandidates(settings.getenv('TICKERS').split(','), workers, getRsiPeriods(accountState)['buy'], atTheOpen)
+                    buyAssets(buyCandidates, positionBook, accountState, ordersEnabled)
+
+                #performance reporting
+                if not paperAccount:
+                    performance.update()
+                    ls.log.info(performance.getReport())
+
+            except:
+                ls.log.exception("alpha.runPartitioned inner")
+
+            finally:
+                partition.stopWorkers(workers)
+                if listener is not None:
+                    listener.close()
+                stopLocalWorkers(workerProcesses)
+                api.stopLiveDataStream()
+                pool.shutdown()
+
+        else:
+            ls.log.info("Run conditions not met. Today is a weekend day, the market is not open, or the market is not closing in the next hour.")
 
-def getOneYearReturn():
+    except:
+        ls.log.exception("alpha.runPartitioned")
+
+    finally:
+        instrumentation.emitReport()
+        ls.log.info("PARTITIONED END")
+
+
+def getPartitionedBuyCandidates(symbolList, workers, rsiPeriod, atTheOpen):
     try:
-        periodStart = str(tk.todayMinus1YearPlus2DaysFormatted)
-        cashDeposits = api.getCashDeposits(periodStart)
-        cashWithdrawals = api.getCashWithdrawals(periodStart)
-        portfolioHistory = api.getPortfolioHistory()
-        
-        totalDeposits = float(0)
-        for deposit in cashDeposits:
-            totalDeposits += float(deposit['net_amount'])
-        
-        totalWithdrawals = float(0)
-        for withdrawal in cashWithdrawals:
-            totalWithdrawals += float(withdrawal['net_amount'])
-
-        startingEquity = float(portfolioHistory['equity'][0])
-        endingEquity = float(portfolioHistory['equity'][len(portfolioHistory['equity'])-1])
-
-        # withdrawals are negative, so we add them not subtract them here
-        adjustedStartingEquity = startingEquity + totalDeposits + totalWithdrawals
-        returnPercentage = (endingEquity - adjustedStartingEquity) / adjustedStartingEquity
-        return float('%.6f' % returnPercentage)
+        shards = partition.HashRing(sorted(workers), int(settings.getenv('PARTITION_VIRTUAL_NODES'))).partition(symbolList)
+
+        shardWorkers = {workerName: workers[workerName] for workerName in shards if workerName in workers}
+
+        for workerName, connection in shardWorkers.items():
+            connection.send(('evaluate', shards[workerName], rsiPeriod, atTheOpen))
+
+        results = partition.gatherResults(shardWorkers, int(settings.getenv('PARTITION_RESULT_SECONDS')))
+        ls.log.info({'shards': {str(workerName): len(shard) for workerName, shard in shards.items()}, 'returned': sorted(results)})
+
+        # a shard whose worker never joined, failed or timed out is evaluated here, so a lost worker costs time rather than candidates
+        missingSymbols = [symbol for workerName, shard in shards.items() if workerName not in results for symbol in shard]
+        if missingSymbols:
+            for symbol in missingSymbols:
+                api.subscribeLiveData(symbol)
+
+            api.waitForLiveData(missingSymbols, int(settings.getenv('WAIT_FOR_LIVE_DATA_SECONDS')))
+            results[None] = selectBuyCandidates(missingSymbols, rsiPeriod, atTheOpen, {})
+
+            for symbol in missingSymbols:
+                api.unSubscribeLiveData(symbol)
+
+        # one ranked list, most oversold first and TICKERS order on ties, so sizing is the same as for a single process
+        tickerOrder = {symbol: index for index, symbol in enumerate(symbolList)}
+        buyCandidates = [candidate for candidates in results.values() for candidate in candidates]
+        buyCandidates.sort(key=lambda candidate: (candidate[2], tickerOrder[candidate[0]]))
 
+        return buyCandidates
     except:
-        ls.log.exception("alpha.getOneYearReturn")
+        ls.log.exception("alpha.getPartitionedBuyCandidates")
+        return []
 
 
-def getOneYearBenchmarkReturn():
+def startLocalWorkers(workerCount):
     try:
-        benchmarkSymbol = os.getenv('BENCHMARK_SYMBOL')
-        barsData = api.getStockBars(benchmarkSymbol, tk.todayMinus1Year, tk.nowMinus15Minutes).data[benchmarkSymbol]
-        startingPrice = float(barsData[0].close)
-        endingPrice = float(barsData[len(barsData)-1].close)
-        benchmarkDividendYield = getDividendYield(benchmarkSymbol, endingPrice)
-        returnPercentage = ((endingPrice - startingPrice) / startingPrice) + benchmarkDividendYield
-        return float('%.6f' % returnPercentage)
+        # spawned rather than forked, so every worker opens its own stream, sockets and log listener instead of sharing the coordinator's
+        context = multiprocessing.get_context('spawn')
+        workerProcesses = []
+
+        for index in range(workerCount):
+            os.environ['PARTITION_WORKER_NAME'] = 'worker' + str(index)
+            workerProcess = context.Process(target=runWorker, daemon=True)
+            workerProcess.start()
+            workerProcesses.append(workerProcess)
+
+        os.environ.pop('PARTITION_WORKER_NAME', None)
+        return workerProcesses
     except:
-        ls.log.exception("alpha.getOneYearBenchmarkReturn")
+        ls.log.exception("alpha.startLocalWorkers")
+        return []
 
 
-def getDividendYield(symbol, price):
+def stopLocalWorkers(workerProcesses):
     try:
-        dividendHistory = api.getDividendHistory(symbol)
-        annualDividend = 0
-        for dividendPayment in dividendHistory:
-            if dividendPayment['paymentDate'] >= tk.todayMinus1YearFormatted:
-                annualDividend += dividendPayment['dividend']
-            else:
-                break
-        dividendYield = annualDividend / price
-        return dividendYield
+        for workerProcess in workerProcesses:
+            workerProcess.join(int(settings.getenv('PARTITION_JOIN_SECONDS')))
+            if workerProcess.is_alive():
+                workerProcess.terminate()
     except:
-        ls.log.exception("alpha.getDividendYield")
+        ls.log.exception("alpha.stopLocalWorkers")
+
+
+def runWorker():
+    try:
+        workerName = settings.getenv('PARTITION_WORKER_NAME')
+        ls.log.info({'workerStart': workerName})
+
+        connection = partition.connectToCoordinator(workerName, int(settings.getenv('PARTITION_JOIN_SECONDS')))
+        if connection is None:
+            return
+
+        pool = ThreadPoolExecutor(1)
+        pool.submit(api.startLiveDataStream)
+
+        try:
+            while True:
+                try:
+                    message = connection.recv()
+                except EOFError:
+                    break
+
+                if message[0] != 'evaluate':
+                    break
+
+                tk.refresh()
+                instrumentation.reset()
+                shard, rsiPeriod, atTheOpen = message[1], message[2], message[3]
+
+                # the shard has its own subscription and snapshot, so no single websocket carries the whole universe
+                for symbol in shard:
+                    api.subscribeLiveData(symbol)
+
+                api.waitForLiveData(shard, int(settings.getenv('WAIT_FOR_LIVE_DATA_SECONDS')))
+                buyCandidates = selectBuyCandidates(shard, rsiPeriod, atTheOpen, {})
+
+                for symbol in shard:
+                    api.unSubscribeLiveData(symbol)
+
+                connection.send(('candidates', buyCandidates))
+                ls.log.info({'instrumentation': instrumentation.getReport()})
+
+        finally:
+            connection.close()
+            api.stopLiveDataStream()
+            pool.shutdown()
+
+    except:
+        ls.log.exception("alpha.runWorker")
+
+    finally:
+        ls.log.info("WORKER STOP")
+
+
+def getNextRunTime(marketClock, completedRuns):
+    try:
+        openDelay = timedelta(minutes=int(settings.getenv('DAEMON_OPEN_DELAY_MINUTES')))
+        closeLead = timedelta(minutes=int(settings.getenv('DAEMON_CLOSE_LEAD_MINUTES')))
+
+        if not marketClock['is_open']:
+            return marketClock['next_open'] + openDelay
+
+        if tk.hour == 9 and (tk.formattedDate, 'open') not in completedRuns:
+            return tk.currentDateTime
+
+        if (tk.formattedDate, 'close') not in completedRuns:
+            return max(marketClock['next_close'] - closeLead, tk.currentDateTime)
+
+        # both evaluations are done for today, check again once the market has closed
+        return marketClock['next_close'] + timedelta(minutes=1)
+    except:
+        ls.log.exception("alpha.getNextRunTime")
+
+
+def getBuyOrderQuantities(limitPrices, rsiValues, accountState):
+    try:
+        account = accountState.current()
+        return strategy.allocateBuyOrders(limitPrices, rsiValues, account['equity'], account['longMarketValue'], account['cash'], strategy.loadParameters())
+    except:
+        ls.log.exception("alpha.getBuyOrderQuantities")
+
+
+def getRsiPeriods(accountState):
+    try:
+        account = accountState.current()
+        return strategy.selectRsiPeriods(account['equity'], account['longMarketValue'], strategy.loadParameters())
+    except:
+        ls.log.exception("alpha.getRsiPeriods")
 
 
 if __name__ == '__main__':
     try:
-        main()
+        if settings.getenv('RUN_MODE') == 'daemon':
+            runDaemon()
+        elif settings.getenv('RUN_MODE') == 'stream':
+            runStream()
+        elif settings.getenv('RUN_MODE') == 'accounts':
+            runAccounts()
+        elif settings.getenv('RUN_MODE') == 'partitioned':
+            runPartitioned()
+        elif settings.getenv('RUN_MODE') == 'worker':
+            runWorker()
+        else:
+            main()
     except:
         ls.log.exception("alpha")
     finally:
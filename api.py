@@ -1,46 +1,201 @@
-import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import timekeeper as tk
 import logsetup as ls
-import requests
+import settings
+import barstore
+import refcache
+import tickstore
+import instrumentation
 
-from time import sleep
-
-from alpaca.trading.client import TradingClient
-from alpaca.trading.requests import LimitOrderRequest, GetCalendarRequest
-from alpaca.trading.enums import OrderSide, TimeInForce, OrderStatus
-
-from alpaca.data import StockHistoricalDataClient, StockBarsRequest, StockLatestBarRequest, StockLatestQuoteRequest, StockLatestTradeRequest, TimeFrame
-from alpaca.data.live import StockDataStream
-
-from alpaca.broker.client import BrokerClient
+from time import sleep, monotonic
+from datetime import timedelta
+from urllib.parse import urlparse
 
 
 try:
-    apiKeyID = os.getenv('API_KEY_ID')
-    secretKey = os.getenv('SECRET_KEY')
-    secondaryDataSourceApiBaseUrl = os.getenv('SECONDARY_DATA_SOURCE_API_BASE_URL')
-    secondaryDataSourceApiKey = os.getenv('SECONDARY_DATA_SOURCE_API_KEY')
-    paperAccount = os.getenv('PAPER_ACCOUNT') == 'True'
-    
-    specialHeaders = {'APCA-API-KEY-ID': apiKeyID, 'APCA-API-SECRET-KEY': secretKey}
-
-    liveQuoteData = {}
-    liveTradeData = {}
-
-    data_client = StockHistoricalDataClient(apiKeyID, secretKey)
-    trading_client = TradingClient(apiKeyID, secretKey, paper=paperAccount)
-    broker_client = BrokerClient(apiKeyID, secretKey, sandbox=paperAccount)
-    wss_client = StockDataStream(apiKeyID, secretKey)
+    # market data is shared by every account, so the data and stream clients always use the base credentials
+    apiKeyID = settings.getenv('API_KEY_ID')
+    secretKey = settings.getenv('SECRET_KEY')
+    secondaryDataSourceApiBaseUrl = settings.getenv('SECONDARY_DATA_SOURCE_API_BASE_URL')
+    secondaryDataSourceApiKey = settings.getenv('SECONDARY_DATA_SOURCE_API_KEY')
+
+    liveDataStreamReady = threading.Event()
+    liveDataEventsLock = threading.Lock()
+    liveQuoteEvents = {}
+    liveTradeEvents = {}
+    liveTradeListeners = []
+
+    rateLimitLock = threading.Lock()
+    rateLimitNextRequestTimes = {}
+
+    httpTimeoutSeconds = float(settings.getenv('HTTP_TIMEOUT_SECONDS'))
+    httpRetryAttempts = int(settings.getenv('HTTP_RETRY_ATTEMPTS'))
+    httpMaxConcurrency = int(settings.getenv('HTTP_MAX_CONCURRENCY'))
+    httpRetryStatuses = [429, 500, 502, 503, 504]
+
+    # clients and the http session are built on first use, so a run that stops at the pre-flight checks never imports alpaca
+    clientsLock = threading.Lock()
+    clients = {}
 except:
     ls.log.error("Error initializing api, quitting program.")
     ls.log.exception("api")
     quit()
 
 
+def getClient(name, buildClient):
+    with clientsLock:
+        if name not in clients:
+            clients[name] = buildClient()
+        return clients[name]
+
+
+def getDataClient():
+    from alpaca.data import StockHistoricalDataClient
+    return getClient('data', lambda: StockHistoricalDataClient(apiKeyID, secretKey))
+
+
+def getAccountCredentials():
+    return settings.getenv('API_KEY_ID'), settings.getenv('SECRET_KEY'), settings.getenv('PAPER_ACCOUNT') == 'True'
+
+
+def getSpecialHeaders():
+    accountKeyID, accountSecretKey, paperAccount = getAccountCredentials()
+    return {'APCA-API-KEY-ID': accountKeyID, 'APCA-API-SECRET-KEY': accountSecretKey}
+
+
+def getTradingClient():
+    from alpaca.trading.client import TradingClient
+    accountKeyID, accountSecretKey, paperAccount = getAccountCredentials()
+    return getClient(('trading', accountKeyID), lambda: TradingClient(accountKeyID, accountSecretKey, paper=paperAccount))
+
+
+def getBrokerClient():
+    from alpaca.broker.client import BrokerClient
+    accountKeyID, accountSecretKey, paperAccount = getAccountCredentials()
+    return getClient(('broker', accountKeyID), lambda: BrokerClient(accountKeyID, accountSecretKey, sandbox=paperAccount))
+
+
+def getWssClient():
+    from alpaca.data.live import StockDataStream
+    return getClient('wss', lambda: StockDataStream(apiKeyID, secretKey))
+
+
+def buildHttpSession():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    # one keep-alive session for every plain http call, so repeat calls skip the tcp and tls handshake
+    httpSession = requests.Session()
+    httpAdapter = HTTPAdapter(
+                        pool_connections=4,
+                        pool_maxsize=httpMaxConcurrency,
+                        max_retries=Retry(total=httpRetryAttempts, backoff_factor=0.5, status_forcelist=httpRetryStatuses, allowed_methods=['GET'])
+    )
+    httpSession.mount('https://', httpAdapter)
+    httpSession.mount('http://', httpAdapter)
+    return httpSession
+
+
+def getHttpSession():
+    return getClient('http', buildHttpSession)
+
+
+def reserveRequestSlot(url):
+    try:
+        host = urlparse(url).netloc
+        requestInterval = 1 / float(settings.getenv('RATE_LIMIT_PER_SECOND'))
+
+        with rateLimitLock:
+            now = monotonic()
+            requestTime = max(now, rateLimitNextRequestTimes.get(host, now))
+            rateLimitNextRequestTimes[host] = requestTime + requestInterval
+
+        return requestTime - now
+    except:
+        ls.log.exception("api.reserveRequestSlot")
+        return 0
+
+
+def waitForRateLimit(url):
+    try:
+        delay = reserveRequestSlot(url)
+        if delay > 0:
+            sleep(delay)
+    except:
+        ls.log.exception("api.waitForRateLimit")
+
+
+def getEndpointName(url):
+    # the last path segment carries the symbol list on the secondary source, so it is left out of the endpoint name
+    parsedUrl = urlparse(url)
+    return 'http.' + parsedUrl.netloc + parsedUrl.path.rsplit('/', 1)[0]
+
+
+def httpGet(url, headers=None):
+    waitForRateLimit(url)
+    endpointName = getEndpointName(url)
+    with instrumentation.timer(endpointName):
+        response = getHttpSession().get(url, headers=headers, timeout=httpTimeoutSeconds)
+    instrumentation.addBytes(endpointName, len(response.content))
+    return response
+
+
+async def httpGetJsonAsync(client, semaphore, url):
+    import httpx
+
+    for attempt in range(httpRetryAttempts + 1):
+        try:
+            async with semaphore:
+                delay = reserveRequestSlot(url)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                startTime = monotonic()
+                response = await client.get(url)
+                instrumentation.recordDuration(getEndpointName(url), monotonic() - startTime)
+                instrumentation.addBytes(getEndpointName(url), len(response.content))
+        except httpx.TransportError:
+            if attempt == httpRetryAttempts:
+                raise
+            await asyncio.sleep(0.5 * 2 ** attempt)
+            continue
+
+        if response.status_code in httpRetryStatuses and attempt < httpRetryAttempts:
+            await asyncio.sleep(0.5 * 2 ** attempt)
+            continue
+
+        # any other error status, such as bad keys or an unknown symbol, would fail the same way again
+        response.raise_for_status()
+        return response.json()
+
+
+async def httpGetJsonConcurrently(urls):
+    import httpx
+
+    limits = httpx.Limits(max_connections=httpMaxConcurrency, max_keepalive_connections=httpMaxConcurrency)
+    semaphore = asyncio.Semaphore(httpMaxConcurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=httpTimeoutSeconds) as client:
+        return await asyncio.gather(*[httpGetJsonAsync(client, semaphore, url) for url in urls], return_exceptions=True)
+
+
+@instrumentation.timed
 def getMarketClock():
     try:
-        return trading_client.get_clock()
+        # the clock only changes at the next open or close, so it is cached as a plain dict until then
+        marketClock = refcache.getEntry('marketClock')
+        if marketClock is None:
+            clock = getTradingClient().get_clock()
+            marketClock = {
+                            'is_open': clock.is_open,
+                            'next_open': clock.next_open,
+                            'next_close': clock.next_close
+            }
+            refcache.setEntry('marketClock', marketClock, (min(clock.next_open, clock.next_close) - clock.timestamp).total_seconds())
+        return marketClock
     except:
         ls.log.exception("api.getMarketClock")
         quit()
@@ -48,6 +203,7 @@ def getMarketClock():
 
 def decodeTimeInForce(timeInForce):
     try:
+        from alpaca.trading.enums import TimeInForce
         match timeInForce:
             case 'fok':
                 timeInForce = TimeInForce.FOK
@@ -68,10 +224,14 @@ def decodeTimeInForce(timeInForce):
         ls.log.exception("api.decodeTimeInForce")
 
 
+@instrumentation.timed
 def submitOrder(symbol, quantity, limitPrice, orderSide):
 
     try:
-        timeInForce = decodeTimeInForce(os.getenv('TIME_IN_FORCE'))
+        from alpaca.trading.requests import LimitOrderRequest
+        from alpaca.trading.enums import OrderSide
+
+        timeInForce = decodeTimeInForce(settings.getenv('TIME_IN_FORCE'))
 
         limit_order_data = LimitOrderRequest(
                             side=OrderSide.BUY if orderSide == 'buy' else OrderSide.SELL,
@@ -81,9 +241,10 @@ def submitOrder(symbol, quantity, limitPrice, orderSide):
                             time_in_force=timeInForce
         )
 
-        orderID = str(trading_client.submit_order(order_data=limit_order_data).id)
+        orderID = str(getTradingClient().submit_order(order_data=limit_order_data).id)
 
         ls.log.info(str(orderSide + " order id " + orderID + " submitted"))
+        instrumentation.count('orders.submitted')
 
         return orderID
 
@@ -91,142 +252,455 @@ def submitOrder(symbol, quantity, limitPrice, orderSide):
         ls.log.exception("api.submitOrder")
 
 
-def orderFilled(orderID):
+@instrumentation.timed
+def submitOrders(orders):
     try:
-        orderWaitIterations = int(os.getenv('ORDER_WAIT_ITERATIONS'))
-        orderWaitSeconds = int(os.getenv('ORDER_WAIT_SECONDS'))
-        
-        for i in range(orderWaitIterations):    
-            orderStatus = trading_client.get_order_by_id(order_id=orderID).status
-            if orderStatus == OrderStatus.FILLED:
-                ls.log.info(str("order id " + orderID + " filled"))
-                return True
-            elif orderStatus == OrderStatus.CANCELED:
-                ls.log.info(str("order id " + orderID + " canceled"))
-                return False
-            sleep(orderWaitSeconds)
+        orderWorkers = max(1, int(settings.getenv('ORDER_WORKERS')))
+
+        # map keeps order ids aligned with the orders passed in
+        with ThreadPoolExecutor(orderWorkers) as pool:
+            orderIDs = list(pool.map(settings.propagate(lambda order: submitOrder(*order)), orders))
 
-        trading_client.cancel_order_by_id(order_id=orderID)
-        ls.log.info(str("order id " + orderID + " not filled, canceled"))
-        return False
+        return orderIDs
     except:
-        ls.log.exception("api.orderFilled")
+        ls.log.exception("api.submitOrders")
 
 
-def getFilledOrderAveragePrice(orderID):
+@instrumentation.timed
+def getOrdersByID(orderIDs, submittedAfter):
     try:
-        filledAveragePrice = trading_client.get_order_by_id(order_id=orderID).filled_avg_price
-        return filledAveragePrice
+        from alpaca.common.enums import Sort
+        from alpaca.trading.requests import GetOrdersRequest
+        from alpaca.trading.enums import QueryOrderStatus
+
+        ordersPageSize = 500
+        orders = {}
+        pageAfter = submittedAfter
+
+        # a phase can submit more orders than one page holds, so pages are read oldest first until a short page ends the list
+        while True:
+            getOrdersRequest = GetOrdersRequest(status=QueryOrderStatus.ALL, after=pageAfter, limit=ordersPageSize, direction=Sort.ASC)
+            ordersPage = getTradingClient().get_orders(filter=getOrdersRequest)
+            orders.update({str(order.id): order for order in ordersPage if str(order.id) in orderIDs})
+
+            if len(ordersPage) < ordersPageSize or ordersPage[-1].submitted_at == pageAfter:
+                break
+            pageAfter = ordersPage[-1].submitted_at
+
+        # orders sharing a timestamp with a page boundary can fall between pages, those are looked up one by one
+        for orderID in set(orderIDs) - set(orders):
+            try:
+                orders[orderID] = getTradingClient().get_order_by_id(orderID)
+            except:
+                ls.log.exception("api.getOrdersByID " + orderID)
+
+        return orders
+    except:
+        ls.log.exception("api.getOrdersByID")
+
+
+@instrumentation.timed
+def awaitOrderFills(orderIDs):
+    try:
+        from alpaca.trading.enums import OrderStatus
+
+        orderWaitIterations = int(settings.getenv('ORDER_WAIT_ITERATIONS'))
+        orderWaitSeconds = int(settings.getenv('ORDER_WAIT_SECONDS'))
+        deadline = monotonic() + orderWaitIterations * orderWaitSeconds
+
+        # fills map an order id to (fill price, filled quantity), order ids that failed to submit are None and resolve immediately as unfilled
+        fills = {orderID: None for orderID in orderIDs}
+        pendingOrderIDs = {orderID for orderID in orderIDs if orderID is not None}
+        submittedAfter = tk.currentDateTime - timedelta(minutes=1)
+
+        def resolveOrders(orders, final=False):
+            for orderID, order in orders.items():
+                filledQuantity = float(order.filled_qty or 0)
+
+                if order.status == OrderStatus.FILLED:
+                    fills[orderID] = (float(order.filled_avg_price), filledQuantity)
+                    pendingOrderIDs.discard(orderID)
+                    ls.log.info(str("order id " + orderID + " filled"))
+                    instrumentation.count('orders.filled')
+                elif order.status in (OrderStatus.CANCELED, OrderStatus.EXPIRED, OrderStatus.REJECTED) or (final and filledQuantity > 0):
+                    # an order canceled after a partial fill still bought or sold its filled quantity
+                    if filledQuantity > 0:
+                        fills[orderID] = (float(order.filled_avg_price), filledQuantity)
+                        ls.log.info(str("order id " + orderID + " partially filled " + str(filledQuantity)))
+                        instrumentation.count('orders.partially_filled')
+                    pendingOrderIDs.discard(orderID)
+                    ls.log.info(str("order id " + orderID + " " + order.status.value))
+                    instrumentation.count('orders.' + order.status.value)
+
+        while pendingOrderIDs:
+            resolveOrders(getOrdersByID(pendingOrderIDs, submittedAfter) or {})
+            if not pendingOrderIDs or monotonic() >= deadline:
+                break
+            sleep(orderWaitSeconds)
+
+        if pendingOrderIDs:
+            for orderID in pendingOrderIDs:
+                try:
+                    getTradingClient().cancel_order_by_id(order_id=orderID)
+                except:
+                    ls.log.exception("api.awaitOrderFills cancel")
+
+            # an order can fill, fully or partly, between the last poll and its cancel request
+            resolveOrders(getOrdersByID(set(pendingOrderIDs), submittedAfter) or {}, final=True)
+
+            for orderID in pendingOrderIDs:
+                ls.log.info(str("order id " + orderID + " not filled, canceled"))
+                instrumentation.count('orders.unfilled')
+
+        return fills
     except:
-        ls.log.exception("api.getFilledOrderAveragePrice")
+        ls.log.exception("api.awaitOrderFills")
+        return {}
 
 
 def getTradingCalendar():
     try:
+        # the calendar window only moves with the date, so one fetch serves every snapshot of the day
+        return refcache.getOrFetch('calendar:' + tk.formattedDate, 'CALENDAR_CACHE_TTL_SECONDS', fetchTradingCalendar)
+    except:
+        ls.log.exception("api.getTradingCalendar")
+
+
+@instrumentation.timed
+def fetchTradingCalendar():
+    try:
+        from alpaca.trading.requests import GetCalendarRequest
+
         calendarStartDate = tk.todayMinus30Days
         calendarRequest = GetCalendarRequest(start=calendarStartDate, end=tk.currentDateTime)
-        tradingCalendar = trading_client.get_calendar(calendarRequest)
+        tradingCalendar = getTradingClient().get_calendar(calendarRequest)
         return tradingCalendar
     except:
-        ls.log.exception("api.getTradingCalendar")
+        ls.log.exception("api.fetchTradingCalendar")
 
 
-def getStockBars(symbol, startDate, endDate):
+def chunkSymbols(symbols):
     try:
-        stockBarsRequest = StockBarsRequest(
-                                symbol_or_symbols=symbol,
-                                start=startDate,
-                                end=endDate,
-                                timeframe=TimeFrame.Day
-                                    
-        )
-        return data_client.get_stock_bars(stockBarsRequest)
+        chunkSize = int(settings.getenv('SNAPSHOT_CHUNK_SIZE'))
+        return [symbols[i:i + chunkSize] for i in range(0, len(symbols), chunkSize)]
+    except:
+        ls.log.exception("api.chunkSymbols")
+
+
+@instrumentation.timed
+def fetchStockBars(symbols, startDate, endDate):
+    try:
+        from alpaca.data import StockBarsRequest, TimeFrame
+
+        barsData = {}
+
+        for symbolChunk in chunkSymbols(symbols):
+            stockBarsRequest = StockBarsRequest(
+                                    symbol_or_symbols=symbolChunk,
+                                    start=startDate,
+                                    end=endDate,
+                                    timeframe=TimeFrame.Day
+            )
+            for symbol, bars in getDataClient().get_stock_bars(stockBarsRequest).data.items():
+                barsData[symbol] = [barstore.Bar(tk.sessionDateString(bar.timestamp), bar.open, bar.high, bar.low, bar.close, bar.volume) for bar in bars]
+
+        return barsData
+    except:
+        ls.log.exception("api.fetchStockBars")
+
+
+@instrumentation.timed
+def getStockBars(symbols, startDate, endDate):
+    try:
+        symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+        startDay = tk.sessionDateString(startDate)
+        endDay = tk.sessionDateString(endDate)
+
+        # only completed sessions are stored, today's bar is still forming and is always fetched
+        lastCompletedDay = min(endDay, tk.shiftDateString(tk.formattedDate, -1))
+
+        coverage = barstore.getCoverage(symbols)
+        fetchGroups = {}
+        updatedCoverage = {}
+
+        for symbol in symbols:
+            coveredStart, coveredEnd = coverage.get(symbol, (None, None))
+
+            if coveredStart is not None and coveredStart <= startDay and coveredEnd >= tk.shiftDateString(startDay, -1):
+                fetchStart = tk.shiftDateString(coveredEnd, 1)
+                updatedCoverage[symbol] = (coveredStart, max(coveredEnd, lastCompletedDay))
+            else:
+                fetchStart = startDay
+                contiguous = coveredStart is not None and coveredStart <= tk.shiftDateString(lastCompletedDay, 1)
+                updatedCoverage[symbol] = (startDay, max(coveredEnd, lastCompletedDay) if contiguous else lastCompletedDay)
+
+            if fetchStart <= endDay:
+                fetchGroups.setdefault(fetchStart, []).append(symbol)
+
+        fetchedCompletedBars = {}
+        currentBars = {}
+
+        for fetchStart, groupSymbols in fetchGroups.items():
+            fetchStartDate = startDate if fetchStart == startDay else tk.stringToDate(fetchStart)
+            fetchedBars = fetchStockBars(groupSymbols, fetchStartDate, endDate)
+            completedBars = {}
+
+            for symbol, bars in fetchedBars.items():
+                completedBars[symbol] = [bar for bar in bars if bar.date <= lastCompletedDay]
+                currentBars[symbol] = [bar for bar in bars if bar.date > lastCompletedDay]
+
+            if not barstore.writeBars(completedBars, {symbol: updatedCoverage[symbol] for symbol in groupSymbols}):
+                ls.log.warning({'barStoreWriteFailed': groupSymbols})
+            fetchedCompletedBars.update(completedBars)
+
+        storedBars = barstore.readBars(symbols, startDay, endDay)
+        if storedBars is None:
+            raise Exception("Error reading bar store.")
+
+        barsData = {}
+        for symbol in symbols:
+            # fetched sessions are merged in directly, so a store write that failed or was locked out never drops them from the result
+            sessionBars = {bar.date: bar for bar in storedBars.get(symbol, [])}
+            sessionBars.update({bar.date: bar for bar in fetchedCompletedBars.get(symbol, []) if bar.date >= startDay})
+            barsData[symbol] = [sessionBars[date] for date in sorted(sessionBars)] + currentBars.get(symbol, [])
+
+        ls.log.debug({'barSymbols': len(symbols), 'barFetchGroups': len(fetchGroups)})
+
+        return barsData
     except:
         ls.log.exception("api.getStockBars")
 
 
+@instrumentation.timed
 def getStockLatestBar(symbol):
     try:
+        from alpaca.data import StockLatestBarRequest
+
         stockLatestBarRequest = StockLatestBarRequest(symbol_or_symbols=symbol)
-        return data_client.get_stock_latest_bar(stockLatestBarRequest)
+        return getDataClient().get_stock_latest_bar(stockLatestBarRequest)
     except:
         ls.log.exception("api.getStockLatestBar")
 
 
+@instrumentation.timed
 def getLatestQuote(symbol):
     try:
+        from alpaca.data import StockLatestQuoteRequest
+
         stockLatestQuoteRequest = StockLatestQuoteRequest(symbol_or_symbols=symbol)
-        return data_client.get_stock_latest_quote(stockLatestQuoteRequest)[symbol]
+        return getDataClient().get_stock_latest_quote(stockLatestQuoteRequest)[symbol]
     except:
         ls.log.exception("api.getLatestQuote")
 
 
+@instrumentation.timed
+def getLatestQuotes(symbols):
+    try:
+        from alpaca.data import StockLatestQuoteRequest
+
+        latestQuotes = {}
+        for symbolChunk in chunkSymbols(list(symbols)):
+            stockLatestQuoteRequest = StockLatestQuoteRequest(symbol_or_symbols=symbolChunk)
+            latestQuotes.update(getDataClient().get_stock_latest_quote(stockLatestQuoteRequest))
+        return latestQuotes
+    except:
+        ls.log.exception("api.getLatestQuotes")
+
+
+@instrumentation.timed
 def getLatestTrade(symbol):
     try:
+        from alpaca.data import StockLatestTradeRequest
+
         stockLatestTradeRequest = StockLatestTradeRequest(symbol_or_symbols=symbol)
-        return data_client.get_stock_latest_trade(stockLatestTradeRequest)[symbol]
+        return getDataClient().get_stock_latest_trade(stockLatestTradeRequest)[symbol]
     except:
         ls.log.exception("api.getLatestTrade")
 
 
+@instrumentation.timed
+def getLatestTrades(symbols):
+    try:
+        from alpaca.data import StockLatestTradeRequest
+
+        latestTrades = {}
+        for symbolChunk in chunkSymbols(list(symbols)):
+            stockLatestTradeRequest = StockLatestTradeRequest(symbol_or_symbols=symbolChunk)
+            latestTrades.update(getDataClient().get_stock_latest_trade(stockLatestTradeRequest))
+        return latestTrades
+    except:
+        ls.log.exception("api.getLatestTrades")
+
+
+@instrumentation.timed
+def getMarketDataSnapshot(symbols):
+    try:
+        symbols = list(symbols)
+        tradingCalendar = getTradingCalendar()
+
+        snapshot = {
+                    'bars': getStockBars(symbols, tradingCalendar[0].close, tk.nowMinus15Minutes),
+                    'quotes': getLatestQuotes(symbols),
+                    'trades': getLatestTrades(symbols),
+                    'secondaryPrices': getSecondaryPrices(symbols)
+        }
+
+        ls.log.debug({'snapshotSymbols': len(symbols), 'snapshotChunks': len(chunkSymbols(symbols))})
+
+        return snapshot
+    except:
+        ls.log.exception("api.getMarketDataSnapshot")
+
+
+@instrumentation.timed
 def getAccountInformation():
     try:
-        accountInformation = trading_client.get_account()
+        accountInformation = getTradingClient().get_account()
         return accountInformation
     except:
         ls.log.exception("api.getAccountInformation")
 
 
+def getLiveDataEvent(liveDataEvents, symbol):
+    try:
+        # the lookup runs on every tick, so an event is only built the first time a symbol is seen
+        liveDataEvent = liveDataEvents.get(symbol)
+        if liveDataEvent is None:
+            with liveDataEventsLock:
+                liveDataEvent = liveDataEvents.setdefault(symbol, threading.Event())
+        return liveDataEvent
+    except:
+        ls.log.exception("api.getLiveDataEvent")
+
+
 async def liveQuoteDataHandler(data):
     try:
-        liveQuoteData[data.symbol] = data
+        tickstore.recordQuote(data.symbol, data.bid_price, data.ask_price, data.timestamp.timestamp())
+        liveDataEvent = getLiveDataEvent(liveQuoteEvents, data.symbol)
+        if not liveDataEvent.is_set():
+            liveDataEvent.set()
     except:
         ls.log.exception("api.liveQuoteDataHandler")
 
 
 async def liveTradeDataHandler(data):
     try:
-        liveTradeData[data.symbol] = data
+        tickstore.recordTrade(data.symbol, data.price, data.size, data.timestamp.timestamp())
+        liveDataEvent = getLiveDataEvent(liveTradeEvents, data.symbol)
+        if not liveDataEvent.is_set():
+            liveDataEvent.set()
+        for listener in liveTradeListeners:
+            listener(data.symbol, data.price)
     except:
         ls.log.exception("api.liveTradeDataHandler")
 
 
+def addLiveTradeListener(listener):
+    global liveTradeListeners
+    try:
+        # the list is replaced rather than mutated, so the websocket thread never iterates a list that is changing
+        with liveDataEventsLock:
+            liveTradeListeners = liveTradeListeners + [listener]
+    except:
+        ls.log.exception("api.addLiveTradeListener")
+
+
+def removeLiveTradeListener(listener):
+    global liveTradeListeners
+    try:
+        with liveDataEventsLock:
+            liveTradeListeners = [existingListener for existingListener in liveTradeListeners if existingListener != listener]
+    except:
+        ls.log.exception("api.removeLiveTradeListener")
+
+
 def subscribeLiveData(symbol):
     try:
-        wss_client.subscribe_quotes(liveQuoteDataHandler, symbol)
-        wss_client.subscribe_trades(liveTradeDataHandler, symbol)
+        getWssClient().subscribe_quotes(liveQuoteDataHandler, symbol)
+        getWssClient().subscribe_trades(liveTradeDataHandler, symbol)
     except:
         ls.log.exception("api.subscribeLiveQuotes")
 
 
 def unSubscribeLiveData(symbol):
     try:
-        wss_client.unsubscribe_quotes(symbol)
-        wss_client.unsubscribe_trades(symbol)
-        if symbol in liveQuoteData: del liveQuoteData[symbol]
-        if symbol in liveTradeData: del liveTradeData[symbol]
+        getWssClient().unsubscribe_quotes(symbol)
+        getWssClient().unsubscribe_trades(symbol)
+        tickstore.clear(symbol)
+        with liveDataEventsLock:
+            liveQuoteEvents.pop(symbol, None)
+            liveTradeEvents.pop(symbol, None)
     except:
         ls.log.exception("api.unSubscribeLiveQuotes")
 
 
 def startLiveDataStream():
     try:
-        wss_client.run()
+        liveDataStreamReady.clear()
+        getWssClient().run()
     except:
         ls.log.exception("api.startLiveDataStream")
 
 
 def stopLiveDataStream():
     try:
-        wss_client.stop()
+        getWssClient().stop()
+        liveDataStreamReady.clear()
     except:
         ls.log.exception("api.stopLiveDataStream")
 
 
+@instrumentation.timed
+def waitForLiveDataStream(timeoutSeconds):
+    try:
+        # the sdk exposes no connect callback; _running flips once the socket is connected and authenticated
+        deadline = monotonic() + timeoutSeconds
+        while not liveDataStreamReady.is_set() and monotonic() < deadline:
+            if getattr(getWssClient(), '_running', False):
+                liveDataStreamReady.set()
+            else:
+                sleep(0.05)
+
+        if not liveDataStreamReady.is_set():
+            ls.log.warning("Live data stream not connected after " + str(timeoutSeconds) + " seconds.")
+
+        return liveDataStreamReady.is_set()
+    except:
+        ls.log.exception("api.waitForLiveDataStream")
+
+
+@instrumentation.timed
+def waitForLiveData(symbols, timeoutSeconds):
+    try:
+        if not symbols:
+            return []
+
+        # the sdk only opens the socket once a handler is registered, so the connection is awaited here, after subscribing
+        deadline = monotonic() + timeoutSeconds
+        if not waitForLiveDataStream(min(timeoutSeconds, int(settings.getenv('LIVE_DATA_CONNECT_SECONDS')))):
+            # without a connected stream nothing will arrive, so fall straight back to rest
+            deadline = monotonic()
+        silentSymbols = []
+
+        for symbol in symbols:
+            for liveDataEvents in (liveQuoteEvents, liveTradeEvents):
+                if not getLiveDataEvent(liveDataEvents, symbol).wait(max(0, deadline - monotonic())):
+                    silentSymbols.append(symbol)
+                    break
+
+        if silentSymbols:
+            ls.log.info({'liveDataMissing': silentSymbols, 'fallback': 'rest'})
+
+        return silentSymbols
+    except:
+        ls.log.exception("api.waitForLiveData")
+
+
+@instrumentation.timed
 def getSecondaryPrice(symbol):
     try:
         url = secondaryDataSourceApiBaseUrl + f'/v3/quote-short/{symbol}?apikey={secondaryDataSourceApiKey}'
-        response = requests.get(url)
+        response = httpGet(url)
         if not response.ok:
             raise Exception("Error contacting secondary data source api.")
         jsonResponse = response.json()
@@ -236,49 +710,98 @@ def getSecondaryPrice(symbol):
         ls.log.exception("api.getSecondaryPricing")
 
 
+@instrumentation.timed
+def getSecondaryPrices(symbols):
+    try:
+        # quote-short accepts a comma separated symbol list, so the universe costs one request per batch
+        batchSize = int(settings.getenv('SECONDARY_DATA_SOURCE_BATCH_SIZE'))
+        symbols = list(symbols)
+        symbolBatches = [symbols[i:i + batchSize] for i in range(0, len(symbols), batchSize)]
+        urls = [secondaryDataSourceApiBaseUrl + f'/v3/quote-short/{",".join(symbolBatch)}?apikey={secondaryDataSourceApiKey}' for symbolBatch in symbolBatches]
+
+        secondaryPrices = {}
+        for symbolBatch, jsonResponse in zip(symbolBatches, asyncio.run(httpGetJsonConcurrently(urls))):
+            if isinstance(jsonResponse, Exception):
+                ls.log.error("Error contacting secondary data source api for " + str(len(symbolBatch)) + " symbols: " + repr(jsonResponse))
+                continue
+            for quote in jsonResponse:
+                secondaryPrices[quote['symbol']] = quote['price']
+
+        return secondaryPrices
+    except:
+        ls.log.exception("api.getSecondaryPrices")
+        return {}
+
+
 def getDividendHistory(symbol):
+    try:
+        return refcache.getOrFetch('dividends:' + symbol, 'DIVIDEND_CACHE_TTL_SECONDS', lambda: fetchDividendHistory(symbol))
+    except:
+        ls.log.exception("api.getDividendHistory")
+
+
+@instrumentation.timed
+def fetchDividendHistory(symbol):
     try:
         url = secondaryDataSourceApiBaseUrl + f'/v3/historical-price-full/stock_dividend/{symbol}?apikey={secondaryDataSourceApiKey}'
-        response = requests.get(url)
+        response = httpGet(url)
         if not response.ok:
             raise Exception("Error contacting secondary data source api.")
         jsonResponse = response.json()
         dividendHistory = jsonResponse['historical']
         return dividendHistory
     except:
-        ls.log.exception("api.getDividendHistory")
+        ls.log.exception("api.fetchDividendHistory")
 
 
 #######################################################################
 ## All methods below use custom requests due to gaps in native APIs. ##
 #######################################################################
 
+@instrumentation.timed
 def getCashDeposits(afterTimestamp):
     try:
-        #This method should eventually use broker_client.get_account_activities()
+        #This method should eventually use getBrokerClient().get_account_activities()
         url = 'https://api.alpaca.markets/v2/account/activities/CSD?after=' + afterTimestamp
-        response = requests.get(url=url, headers=specialHeaders).json()
-        return response
+        response = httpGet(url, headers=getSpecialHeaders())
+        if not response.ok:
+            raise Exception("Error contacting alpaca activities api.")
+        return response.json()
     except:
         ls.log.exception("api.getCashDeposits")
 
 
+@instrumentation.timed
 def getCashWithdrawals(afterTimestamp):
     try:
-        #This method should eventually use broker_client.get_account_activities()
+        #This method should eventually use getBrokerClient().get_account_activities()
         url = 'https://api.alpaca.markets/v2/account/activities/CSW?after=' + afterTimestamp
-        response = requests.get(url=url, headers=specialHeaders).json()
-        return response
+        response = httpGet(url, headers=getSpecialHeaders())
+        if not response.ok:
+            raise Exception("Error contacting alpaca activities api.")
+        return response.json()
     except:
         ls.log.exception("api.getCashWithdrawals")
 
 
-def getPortfolioHistory():
+def getPortfolioHistory(period='1A', start=None):
     try:
-        #This method should eventually use broker_client.get_portfolio_history_for_account()
-        url = 'https://api.alpaca.markets/v2/account/portfolio/history?period=1A'
-        response = requests.get(url=url, headers=specialHeaders).json()
-        return response
+        # a start date takes precedence over the period, so callers can ask for just the days they are missing
+        query = 'timeframe=1D&' + ('start=' + start if start is not None else 'period=' + period)
+        return refcache.getOrFetch('portfolioHistory:' + getAccountCredentials()[0] + ':' + query + ':' + tk.formattedDate, 'PORTFOLIO_HISTORY_CACHE_TTL_SECONDS', lambda: fetchPortfolioHistory(query))
     except:
         ls.log.exception("api.getPortfolioHistory")
 
+
+@instrumentation.timed
+def fetchPortfolioHistory(query):
+    try:
+        #This method should eventually use getBrokerClient().get_portfolio_history_for_account()
+        url = 'https://api.alpaca.markets/v2/account/portfolio/history?' + query
+        response = httpGet(url, headers=getSpecialHeaders())
+        if not response.ok:
+            raise Exception("Error contacting alpaca portfolio history api.")
+        return response.json()
+    except:
+        ls.log.exception("api.fetchPortfolioHistory")
+
@@ -0,0 +1,265 @@
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+from datetime import date, timedelta
+
+import numpy as np
+
+import logsetup as ls
+import barstore
+import signals
+import strategy
+
+
+def main():
+    try:
+        ls.log.info("BACKTEST BEGIN")
+
+        symbolList = os.getenv('TICKERS').split(',')
+        benchmarkSymbol = os.getenv('BENCHMARK_SYMBOL')
+        startDate = os.getenv('BACKTEST_START_DATE')
+        endDate = os.getenv('BACKTEST_END_DATE')
+
+        if os.getenv('BACKTEST_REFRESH_BARS') == 'True':
+            refreshBars(symbolList + [benchmarkSymbol], startDate, endDate)
+
+        priceData = loadPriceData(symbolList, benchmarkSymbol, startDate, endDate)
+        result = runBacktest(priceData, strategy.loadParameters(), float(os.getenv('BACKTEST_INITIAL_EQUITY')))
+        summary = summarizeBacktest(priceData, result)
+
+        ls.log.info(summary)
+        print(summary)
+
+    except:
+        ls.log.exception("backtest.main")
+
+    finally:
+        ls.log.info("BACKTEST END")
+
+
+def refreshBars(symbols, startDate, endDate):
+    try:
+        # only needed to fill the bar store, so the broker clients are not imported for a plain replay
+        import api
+        import timekeeper as tk
+        api.getStockBars(symbols, tk.stringToDate(startDate), tk.stringToDate(endDate))
+    except:
+        ls.log.exception("backtest.refreshBars")
+
+
+def loadPriceData(symbols, benchmarkSymbol, startDate, endDate):
+    try:
+        barsData = barstore.readBars(symbols + [benchmarkSymbol], startDate, endDate)
+        dates = sorted({bar.date for bars in barsData.values() for bar in bars})
+        dateIndex = {sessionDate: column for column, sessionDate in enumerate(dates)}
+
+        opens = np.full((len(symbols), len(dates)), np.nan)
+        closes = np.full((len(symbols), len(dates)), np.nan)
+        benchmark = np.full(len(dates), np.nan)
+
+        for row, symbol in enumerate(symbols):
+            for bar in barsData[symbol]:
+                opens[row, dateIndex[bar.date]] = bar.open
+                closes[row, dateIndex[bar.date]] = bar.close
+
+        for bar in barsData[benchmarkSymbol]:
+            benchmark[dateIndex[bar.date]] = bar.close
+
+        priceData = {
+                        'symbols': list(symbols),
+                        'dates': dates,
+                        'opens': opens,
+                        'closes': closes,
+                        'benchmark': benchmark
+        }
+
+        return priceData
+    except:
+        ls.log.exception("backtest.loadPriceData")
+
+
+def forwardFill(priceMatrix):
+    try:
+        columns = np.where(np.isnan(priceMatrix), 0, np.arange(priceMatrix.shape[1]))
+        np.maximum.accumulate(columns, axis=1, out=columns)
+        return priceMatrix[np.arange(priceMatrix.shape[0])[:, None], columns]
+    except:
+        ls.log.exception("backtest.forwardFill")
+
+
+def getLongMarketValue(lots, markPrices):
+    try:
+        longMarketValue = float(0)
+        for row, rowLots in lots.items():
+            for lot in rowLots:
+                longMarketValue += lot[0] * markPrices[row]
+        return longMarketValue
+    except:
+        ls.log.exception("backtest.getLongMarketValue")
+
+
+def precomputeEvaluations(priceData, periods):
+    try:
+        # the live strategy evaluates once near the open on opening prices and once before the close on closing prices
+        evaluations = []
+        for priceMatrix in (priceData['opens'], priceData['closes']):
+            evaluations.append(
+                                (
+                                    priceMatrix,
+                                    forwardFill(priceMatrix),
+                                    signals.computeRollingRsi(priceMatrix, periods),
+                                    signals.computeRollingPercentUpDown(priceMatrix)
+                                )
+            )
+        return evaluations
+    except:
+        ls.log.exception("backtest.precomputeEvaluations")
+
+
+def runBacktest(priceData, parameters, initialEquity, evaluations=None):
+    try:
+        dates = priceData['dates']
+        rsiPeriodLower = parameters['rsiPeriodLower']
+        periods = list(range(rsiPeriodLower, parameters['rsiPeriodUpper'] + 1))
+        limitBuffer = parameters['limitBuffer']
+        evaluations = evaluations if evaluations is not None else precomputeEvaluations(priceData, periods)
+
+        cash = float(initialEquity)
+        lots = {}
+        dayTradeDates = []
+        equityCurve = np.full(len(dates), np.nan)
+        buyCount = 0
+        sellCount = 0
+        previousSessionDate = None
+
+        for t, sessionDateString in enumerate(dates):
+            sessionDate = date.fromisoformat(sessionDateString)
+
+            # margin interest accrues on a negative cash balance for every calendar day since the last session
+            if previousSessionDate is not None and cash < 0:
+                cash += cash * (parameters['marginInterestRate'] / 360) * (sessionDate - previousSessionDate).days
+
+            dayTradeDates = [dayTradeDate for dayTradeDate in dayTradeDates if dayTradeDate >= sessionDate - timedelta(days=5)]
+
+            for priceMatrix, markMatrix, rsiTensor, percentUpDownMatrix in evaluations:
+                prices = priceMatrix[:, t]
+                markPrices = markMatrix[:, t]
+                percentUpDown = percentUpDownMatrix[:, t]
+
+                #sell
+                longMarketValue = getLongMarketValue(lots, markPrices)
+                rsiPeriods = strategy.selectRsiPeriods(cash + longMarketValue, longMarketValue, parameters)
+                sellRsi = rsiTensor[rsiPeriods['sell'] - rsiPeriodLower][:, t]
+                phaseCash = cash
+
+                for row in list(lots.keys()):
+                    if np.isnan(prices[row]) or np.isnan(sellRsi[row]):
+                        continue
+
+                    limitPriceSell = float('%.2f' % (prices[row] * (1 - limitBuffer)))
+                    remainingLots = []
+
+                    for lot in lots[row]:
+                        quantity, purchaseDate, purchasePrice = lot
+                        boughtToday = purchaseDate == sessionDate
+                        elapsedTimeSellCondition = purchaseDate < sessionDate or strategy.dayTradeAllowed(len(dayTradeDates))
+
+                        if elapsedTimeSellCondition and strategy.sellConditionsMet(percentUpDown[row], sellRsi[row], limitPriceSell, purchasePrice, (sessionDate - purchaseDate).days, boughtToday, phaseCash, parameters):
+                            cash += quantity * limitPriceSell
+                            sellCount += 1
+                            if boughtToday:
+                                dayTradeDates.append(sessionDate)
+                        else:
+                            remainingLots.append(lot)
+
+                    if remainingLots:
+                        lots[row] = remainingLots
+                    else:
+                        del lots[row]
+
+                #buy
+                longMarketValue = getLongMarketValue(lots, markPrices)
+                equity = cash + longMarketValue
+                rsiPeriods = strategy.selectRsiPeriods(equity, longMarketValue, parameters)
+                buyRsi = rsiTensor[rsiPeriods['buy'] - rsiPeriodLower][:, t]
+                pendingOrderCost = 0
+
+                # nan prices and signals compare false, so symbols without a bar this session drop out here
+                candidateRows = np.nonzero((percentUpDown <= 0) & (buyRsi <= parameters['rsiLower']))[0]
+                limitPrices = [float('%.2f' % (prices[row] * (1 + limitBuffer))) for row in candidateRows]
+                quantities = strategy.allocateBuyOrders(limitPrices, buyRsi[candidateRows], equity, longMarketValue, cash, parameters) if len(candidateRows) else []
+
+                for row, limitPriceBuy, quantity in zip(candidateRows, limitPrices, quantities):
+                    if quantity > 0:
+                        lots.setdefault(row, []).append([quantity, sessionDate, limitPriceBuy])
+                        pendingOrderCost += quantity * limitPriceBuy
+                        buyCount += 1
+
+                cash -= pendingOrderCost
+
+            equityCurve[t] = cash + getLongMarketValue(lots, evaluations[1][1][:, t])
+            previousSessionDate = sessionDate
+
+        result = {
+                    'equityCurve': equityCurve,
+                    'cash': cash,
+                    'openLots': sum(len(rowLots) for rowLots in lots.values()),
+                    'buyCount': buyCount,
+                    'sellCount': sellCount
+        }
+
+        return result
+    except:
+        ls.log.exception("backtest.runBacktest")
+
+
+def getPeriodReturn(series, startIndex):
+    try:
+        startingValue = series[startIndex]
+        endingValue = series[len(series) - 1]
+        return float('%.6f' % ((endingValue - startingValue) / startingValue))
+    except:
+        ls.log.exception("backtest.getPeriodReturn")
+
+
+def summarizeBacktest(priceData, result):
+    try:
+        dates = priceData['dates']
+        equityCurve = result['equityCurve']
+        benchmark = forwardFill(priceData['benchmark'][None, :])[0]
+
+        oneYearStartDate = (date.fromisoformat(dates[len(dates) - 1]) - timedelta(days=365)).isoformat()
+        oneYearStartIndex = next(index for index, sessionDate in enumerate(dates) if sessionDate >= oneYearStartDate)
+
+        oneYearReturn = getPeriodReturn(equityCurve, oneYearStartIndex)
+        oneYearBenchmarkReturn = getPeriodReturn(benchmark, oneYearStartIndex)
+        drawdowns = 1 - equityCurve / np.maximum.accumulate(equityCurve)
+
+        summary = {
+                    'startDate': dates[0],
+                    'endDate': dates[len(dates) - 1],
+                    'sessions': len(dates),
+                    'endingEquity': float('%.2f' % equityCurve[len(equityCurve) - 1]),
+                    'totalReturn': getPeriodReturn(equityCurve, 0),
+                    'oneYearPerformance': oneYearReturn,
+                    'oneYearBenchmark': oneYearBenchmarkReturn,
+                    'oneYearVariance': float('%.6f' % (oneYearReturn - oneYearBenchmarkReturn)),
+                    'maxDrawdown': float('%.6f' % np.nanmax(drawdowns)),
+                    'buyCount': result['buyCount'],
+                    'sellCount': result['sellCount'],
+                    'openLots': result['openLots']
+        }
+
+        return summary
+    except:
+        ls.log.exception("backtest.summarizeBacktest")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except:
+        ls.log.exception("backtest")
+    finally:
+        quit()
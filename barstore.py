@@ -0,0 +1,66 @@
+import os
+import sqlite3
+import threading
+import logsetup as ls
+
+from collections import namedtuple
+
+
+Bar = namedtuple('Bar', ['date', 'open', 'high', 'low', 'close', 'volume'])
+
+
+try:
+    barStorePath = os.getenv('BAR_STORE_PATH')
+    barStoreDirectory = os.path.dirname(barStorePath)
+    if barStoreDirectory:
+        os.makedirs(barStoreDirectory, exist_ok=True)
+
+    barStoreLock = threading.Lock()
+    barStore = sqlite3.connect(barStorePath, check_same_thread=False)
+    barStore.execute("CREATE TABLE IF NOT EXISTS bars (symbol TEXT NOT NULL, date TEXT NOT NULL, open REAL, high REAL, low REAL, close REAL, volume REAL, PRIMARY KEY (symbol, date)) WITHOUT ROWID")
+    barStore.execute("CREATE TABLE IF NOT EXISTS coverage (symbol TEXT PRIMARY KEY, startdate TEXT NOT NULL, enddate TEXT NOT NULL)")
+    barStore.commit()
+except:
+    ls.log.error("Error opening bar store, quitting program.")
+    ls.log.exception("barstore")
+    quit()
+
+
+def getCoverage(symbols):
+    try:
+        with barStoreLock:
+            coverage = {}
+            for symbol in symbols:
+                row = barStore.execute("SELECT startdate, enddate FROM coverage WHERE symbol = ?", (symbol,)).fetchone()
+                if row is not None:
+                    coverage[symbol] = row
+            return coverage
+    except:
+        ls.log.exception("barstore.getCoverage")
+
+
+def readBars(symbols, startDate, endDate):
+    try:
+        with barStoreLock:
+            barsData = {}
+            for symbol in symbols:
+                rows = barStore.execute("SELECT date, open, high, low, close, volume FROM bars WHERE symbol = ? AND date >= ? AND date <= ? ORDER BY date", (symbol, startDate, endDate)).fetchall()
+                barsData[symbol] = [Bar(*row) for row in rows]
+            return barsData
+    except:
+        ls.log.exception("barstore.readBars")
+
+
+def writeBars(barsData, coverage):
+    try:
+        with barStoreLock:
+            rows = [(symbol, bar.date, bar.open, bar.high, bar.low, bar.close, bar.volume) for symbol, bars in barsData.items() for bar in bars]
+            barStore.executemany("INSERT OR REPLACE INTO bars (symbol, date, open, high, low, close, volume) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            barStore.executemany("INSERT OR REPLACE INTO coverage (symbol, startdate, enddate) VALUES (?, ?, ?)", [(symbol, startDate, endDate) for symbol, (startDate, endDate) in coverage.items()])
+            barStore.commit()
+            return True
+    except:
+        # bars and coverage are written together or not at all, so a failed write leaves the range to be fetched again
+        barStore.rollback()
+        ls.log.exception("barstore.writeBars")
+        return False
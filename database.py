@@ -1,38 +1,129 @@
-import os
+import threading
 import logsetup as ls
-import mysql.connector
+import settings
+import instrumentation
 
+from time import sleep
 
-dbTableName = str(os.getenv('DB_TABLE_NAME'))
 
+# pools connect on first use, so runs that stop at the pre-flight checks never open a connection
+# accounts that point at the same database share one pool
+dbPools = {}
+dbPoolLock = threading.Lock()
 
-try:
-    db = mysql.connector.connect(
-        host=os.getenv('DB_HOST'),
-        user=os.getenv('DB_USER'),
-        password=os.getenv('DB_PW'),
-        database=os.getenv('DB_NAME')
-    )
-except:
-    ls.log.error("Error connecting to database, quitting program.")
-    ls.log.exception("database")
-    quit()
 
+def getTableName():
+    return str(settings.getenv('DB_TABLE_NAME'))
 
+
+def getPool():
+    poolKey = (settings.getenv('DB_HOST'), settings.getenv('DB_USER'), settings.getenv('DB_NAME'))
+
+    with dbPoolLock:
+        if poolKey not in dbPools:
+            from mysql.connector import pooling
+
+            try:
+                dbPools[poolKey] = pooling.MySQLConnectionPool(
+                    pool_name='alpha' + str(len(dbPools)),
+                    pool_size=int(settings.getenv('DB_POOL_SIZE')),
+                    host=settings.getenv('DB_HOST'),
+                    user=settings.getenv('DB_USER'),
+                    password=settings.getenv('DB_PW'),
+                    database=settings.getenv('DB_NAME')
+                )
+            except:
+                ls.log.error("Error connecting to database.")
+                raise
+
+        return dbPools[poolKey]
+
+
+def getConnection():
+    connection = getPool().get_connection()
+    # pooled connections can sit idle past wait_timeout, ping reconnects them before use
+    connection.ping(reconnect=True, attempts=3, delay=1)
+    return connection
+
+
+def runWithRetry(work):
+    import mysql.connector
+
+    retryAttempts = int(settings.getenv('DB_RETRY_ATTEMPTS'))
+
+    for attempt in range(retryAttempts):
+        connection = None
+        try:
+            connection = getConnection()
+            dbCursor = connection.cursor()
+            try:
+                result = work(dbCursor)
+                connection.commit()
+                return result
+            except:
+                connection.rollback()
+                raise
+            finally:
+                dbCursor.close()
+
+        except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError, mysql.connector.errors.PoolError):
+            if attempt == retryAttempts - 1:
+                raise
+            ls.log.warning("database connection lost, retrying")
+            sleep(2 ** attempt)
+
+        finally:
+            if connection is not None:
+                connection.close()
+
+
+@instrumentation.timed
 def runQuery(query, values):
     try:
-        dbCursor = db.cursor()
-        dbCursor.execute(query, values)
-        db.commit()
+        runWithRetry(lambda dbCursor: dbCursor.execute(query, values))
     except:
         ls.log.exception("database.runQuery")
 
 
+@instrumentation.timed
+def runQueryMany(query, valuesList):
+    try:
+        if valuesList:
+            runWithRetry(lambda dbCursor: dbCursor.executemany(query, valuesList))
+    except:
+        ls.log.exception("database.runQueryMany")
+
+
+@instrumentation.timed
+def runBatch(statements):
+    try:
+        # every (query, valuesList) pair runs in one transaction with a single commit
+        def executeStatements(dbCursor):
+            for query, valuesList in statements:
+                if valuesList:
+                    dbCursor.executemany(query, valuesList)
+
+        runWithRetry(executeStatements)
+        return True
+    except:
+        ls.log.exception("database.runBatch")
+        return False
+
+
+@instrumentation.timed
 def runQueryAndReturnResults(query, values):
     try:
-        dbCursor = db.cursor()
-        dbCursor.execute(query, values)
-        return dbCursor.fetchall()
+        def fetchResults(dbCursor):
+            dbCursor.execute(query, values)
+            return dbCursor.fetchall()
+
+        return runWithRetry(fetchResults)
     except:
         ls.log.exception("database.runQueryAndReturnResults")
-        
\ No newline at end of file
+
+
+def ensureConnection():
+    try:
+        getConnection().close()
+    except:
+        ls.log.exception("database.ensureConnection")
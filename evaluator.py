@@ -0,0 +1,37 @@
+import logsetup as ls
+import settings
+import instrumentation
+import signals
+
+from concurrent.futures import ThreadPoolExecutor
+from asset import Asset
+
+
+@instrumentation.timed
+def evaluateAssets(symbols, rsiPeriod, atTheOpen, snapshot, assetCache=None):
+    try:
+        assetCache = assetCache if assetCache is not None else {}
+        assetWorkers = max(1, int(settings.getenv('ASSET_WORKERS')))
+
+        # each (symbol, rsiPeriod, atTheOpen) is built at most once per cache, however many lots or phases ask for it
+        missingSymbols = list(dict.fromkeys(symbol for symbol in symbols if (symbol, rsiPeriod, atTheOpen) not in assetCache))
+
+        # map preserves input order, so callers make decisions in the same order as the serial loop
+        with ThreadPoolExecutor(assetWorkers) as pool:
+            missingAssets = list(pool.map(settings.propagate(lambda symbol: Asset(symbol, rsiPeriod, atTheOpen, snapshot, deferSignals=True)), missingSymbols))
+
+        # rsi and percentUpDown for the whole batch come from one pass over the symbols x sessions matrix
+        if missingAssets:
+            with instrumentation.timer('evaluator.signals'):
+                currentPrices = [getattr(asset, 'currentPrice', float('nan')) for asset in missingAssets]
+                assetSignals = signals.computeSignals(snapshot['bars'], missingSymbols, currentPrices, atTheOpen, [rsiPeriod])
+
+        for row, (symbol, asset) in enumerate(zip(missingSymbols, missingAssets)):
+            # an asset that failed before its limit prices were set has already logged why and gets no signals
+            if hasattr(asset, 'limitPriceSell'):
+                asset.setSignals(assetSignals['rsi'][row, 0], assetSignals['percentUpDown'][row])
+            assetCache[(symbol, rsiPeriod, atTheOpen)] = asset
+
+        return [assetCache[(symbol, rsiPeriod, atTheOpen)] for symbol in symbols]
+    except:
+        ls.log.exception("evaluator.evaluateAssets")
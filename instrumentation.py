@@ -0,0 +1,137 @@
+import os
+import threading
+import functools
+import logsetup as ls
+import settings
+
+from contextlib import contextmanager
+from time import perf_counter
+
+
+instrumentationLock = threading.Lock()
+durations = {}
+counters = {}
+byteCounters = {}
+
+
+def reset():
+    try:
+        with instrumentationLock:
+            durations.clear()
+            counters.clear()
+            byteCounters.clear()
+    except:
+        ls.log.exception("instrumentation.reset")
+
+
+def recordDuration(name, seconds):
+    with instrumentationLock:
+        durations.setdefault(name, []).append(seconds)
+
+
+def count(name, amount=1):
+    with instrumentationLock:
+        counters[name] = counters.get(name, 0) + amount
+
+
+def addBytes(name, amount):
+    with instrumentationLock:
+        byteCounters[name] = byteCounters.get(name, 0) + amount
+
+
+@contextmanager
+def timer(name):
+    startTime = perf_counter()
+    try:
+        yield
+    finally:
+        recordDuration(name, perf_counter() - startTime)
+
+
+def timed(function):
+    # recorded under module.function, so api, database and order timings group by where they are defined
+    name = function.__module__ + '.' + function.__qualname__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        startTime = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            recordDuration(name, perf_counter() - startTime)
+
+    return wrapper
+
+
+def getPercentile(sortedValues, percentile):
+    # nearest rank, so every reported latency is one that was actually observed
+    return sortedValues[max(0, -(-len(sortedValues) * percentile // 100) - 1)]
+
+
+def getReport():
+    try:
+        with instrumentationLock:
+            names = sorted(set(durations) | set(byteCounters))
+            report = {}
+
+            for name in names:
+                sortedValues = sorted(durations.get(name, []))
+                entry = {'calls': len(sortedValues)}
+                if sortedValues:
+                    entry['p50'] = float('%.6f' % getPercentile(sortedValues, 50))
+                    entry['p95'] = float('%.6f' % getPercentile(sortedValues, 95))
+                    entry['max'] = float('%.6f' % sortedValues[len(sortedValues) - 1])
+                    entry['total'] = float('%.6f' % sum(sortedValues))
+                if name in byteCounters:
+                    entry['bytes'] = byteCounters[name]
+                report[name] = entry
+
+            for name, value in sorted(counters.items()):
+                report.setdefault(name, {})['count'] = value
+
+            return report
+    except:
+        ls.log.exception("instrumentation.getReport")
+
+
+def writePrometheusTextfile(report, textfilePath):
+    try:
+        # samples of one metric family have to be contiguous in the text format
+        durationLines = ['# TYPE alpha_call_duration_seconds summary']
+        byteLines = ['# TYPE alpha_bytes_total counter']
+        eventLines = ['# TYPE alpha_events_total counter']
+
+        for name, entry in report.items():
+            label = '{name="' + name + '"'
+            if 'p50' in entry:
+                durationLines.append('alpha_call_duration_seconds' + label + ',quantile="0.5"} ' + str(entry['p50']))
+                durationLines.append('alpha_call_duration_seconds' + label + ',quantile="0.95"} ' + str(entry['p95']))
+                durationLines.append('alpha_call_duration_seconds' + label + ',quantile="1"} ' + str(entry['max']))
+                durationLines.append('alpha_call_duration_seconds_sum' + label + '} ' + str(entry['total']))
+                durationLines.append('alpha_call_duration_seconds_count' + label + '} ' + str(entry['calls']))
+            if 'bytes' in entry:
+                byteLines.append('alpha_bytes_total' + label + '} ' + str(entry['bytes']))
+            if 'count' in entry:
+                eventLines.append('alpha_events_total' + label + '} ' + str(entry['count']))
+
+        lines = durationLines + byteLines + eventLines
+
+        # node_exporter may read the file at any moment, so it is replaced in one rename
+        temporaryPath = textfilePath + '.tmp'
+        with open(temporaryPath, 'w') as textfile:
+            textfile.write('\n'.join(lines) + '\n')
+        os.replace(temporaryPath, textfilePath)
+    except:
+        ls.log.exception("instrumentation.writePrometheusTextfile")
+
+
+def emitReport():
+    try:
+        report = getReport()
+        ls.log.info({'instrumentation': report})
+
+        textfilePath = settings.getenv('PROMETHEUS_TEXTFILE_PATH')
+        if textfilePath:
+            writePrometheusTextfile(report, textfilePath)
+    except:
+        ls.log.exception("instrumentation.emitReport")
@@ -1,7 +1,10 @@
-from distutils.debug import DEBUG
 import os
+import json
+import queue
+import atexit
 import logging
-import timekeeper as tk
+import logging.handlers
+import settings
 
 def decodeLogLevel(logLevel):
     match logLevel:
@@ -19,13 +22,78 @@ def decodeLogLevel(logLevel):
             logLevel = logging.INFO
     return logLevel
 
+
+class JsonLinesFormatter(logging.Formatter):
+
+    def format(self, record):
+        # dict payloads stay structured in the output instead of being flattened into a string
+        entry = {
+                    'time': self.formatTime(record, self.datefmt) + '.%03d' % record.msecs,
+                    'level': record.levelname,
+                    'thread': record.threadName,
+                    'message': record.msg if isinstance(record.msg, dict) else record.getMessage()
+        }
+
+        if getattr(record, 'account', ''):
+            entry['account'] = record.account
+
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+
+    def prepare(self, record):
+        # the stock prepare formats the record on the caller's thread, here formatting is left to the listener
+        if isinstance(record.msg, dict):
+            record.msg = dict(record.msg)
+        # the account lives in the caller's context, which the listener thread cannot see
+        record.account = settings.accountName.get()
+        return record
+
+
+def getFileHandler(logFilePath):
+    match os.getenv('LOG_ROTATION'):
+        case 'time':
+            return logging.handlers.TimedRotatingFileHandler(logFilePath, when=os.getenv('LOG_ROTATION_WHEN'), backupCount=int(os.getenv('LOG_BACKUP_COUNT')))
+        case _:
+            return logging.handlers.RotatingFileHandler(logFilePath, maxBytes=int(os.getenv('LOG_MAX_BYTES')), backupCount=int(os.getenv('LOG_BACKUP_COUNT')))
+
+
 defaultLogLevel = decodeLogLevel(os.getenv('DEFAULT_LOG_LEVEL'))
 applicationLogLevel = decodeLogLevel(os.getenv('APPLICATION_LOG_LEVEL'))
 
-logging.basicConfig(filename="logs/" + os.getenv('LOG_FILE_PREFIX') + "_" + tk.yearMonthString + ".log", 
-                    format='%(asctime)s.%(msecs)03d %(message)s', 
-                    datefmt='%Y-%d-%m %H:%M:%S', 
-                    level=defaultLogLevel)
+logDirectory = os.getenv('LOG_DIRECTORY', 'logs')
+os.makedirs(logDirectory, exist_ok=True)
+
+# partition workers write their own file, rotation is not safe with several processes on one file
+workerName = os.getenv('PARTITION_WORKER_NAME')
+fileHandler = getFileHandler(os.path.join(logDirectory, os.getenv('LOG_FILE_PREFIX') + ("-" + workerName if workerName else "") + ".log"))
+fileHandler.setFormatter(JsonLinesFormatter(datefmt='%Y-%d-%m %H:%M:%S'))
+
+# records are handed to a background thread, so the decision path never waits on json encoding or disk writes
+logQueue = queue.SimpleQueue()
+logListener = logging.handlers.QueueListener(logQueue, fileHandler, respect_handler_level=True)
+logListener.start()
+atexit.register(logListener.stop)
+
+queueHandler = DeferredQueueHandler(logQueue)
+logging.basicConfig(handlers=[queueHandler], level=defaultLogLevel)
+
+
+def logDirectlyAfterFork():
+    # a forked child inherits the queue but not the listener thread, so it writes straight to a file of its own, rotation is not safe with several processes on one file
+    childFileHandler = getFileHandler(os.path.splitext(fileHandler.baseFilename)[0] + "-" + str(os.getpid()) + ".log")
+    childFileHandler.setFormatter(fileHandler.formatter)
+
+    rootLogger = logging.getLogger()
+    rootLogger.removeHandler(queueHandler)
+    rootLogger.addHandler(childFileHandler)
+
+
+os.register_at_fork(after_in_child=logDirectlyAfterFork)
 
 log = logging.getLogger("applicationLogger")
-log.setLevel(applicationLogLevel)
\ No newline at end of file
+log.setLevel(applicationLogLevel)
@@ -0,0 +1,64 @@
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+
+import logsetup as ls
+import database as db
+
+
+migrationsDirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+
+def main():
+    try:
+        ls.log.info("MIGRATE BEGIN")
+
+        db.runQuery("CREATE TABLE IF NOT EXISTS `schema_version` (`tablename` varchar(64) NOT NULL, `version` int NOT NULL, `applied` timestamp NULL DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (`tablename`, `version`)) ENGINE=InnoDB DEFAULT CHARSET=utf8", ())
+        appliedVersions = {record[0] for record in db.runQueryAndReturnResults("SELECT version FROM schema_version WHERE tablename = %s", (db.getTableName(),))}
+
+        for version, fileName in getMigrations():
+            if version in appliedVersions:
+                continue
+
+            ls.log.info("applying migration " + fileName)
+            applyMigration(version, fileName)
+
+    except:
+        ls.log.exception("migrate.main")
+
+    finally:
+        ls.log.info("MIGRATE END")
+
+
+def getMigrations():
+    try:
+        migrations = []
+        for fileName in sorted(os.listdir(migrationsDirectory)):
+            if fileName.endswith('.sql'):
+                migrations.append((int(fileName.split('_')[0]), fileName))
+        return migrations
+    except:
+        ls.log.exception("migrate.getMigrations")
+
+
+def applyMigration(version, fileName):
+    with open(os.path.join(migrationsDirectory, fileName)) as migrationFile:
+        statements = [statement.strip() for statement in migrationFile.read().replace('{table}', db.getTableName()).split(';') if statement.strip()]
+
+    def executeStatements(dbCursor):
+        # ddl commits implicitly in mysql, so a failed migration stops here and is not recorded
+        for statement in statements:
+            dbCursor.execute(statement)
+        dbCursor.execute("INSERT INTO schema_version (tablename, version) VALUES (%s, %s)", (db.getTableName(), version))
+
+    db.runWithRetry(executeStatements)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except:
+        ls.log.exception("migrate")
+    finally:
+        quit()
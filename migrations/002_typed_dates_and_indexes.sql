@@ -0,0 +1,9 @@
+ALTER TABLE `{table}`
+  MODIFY `purchasedate` date DEFAULT NULL,
+  MODIFY `saledate` date DEFAULT NULL;
+
+ALTER TABLE `{table}`
+  ADD COLUMN `openposition` tinyint(1) GENERATED ALWAYS AS (`saleorderid` IS NULL AND `saledate` IS NULL AND `saleprice` IS NULL) STORED,
+  ADD INDEX `idx_openposition_symbol` (`openposition`, `symbol`),
+  ADD INDEX `idx_symbol_saledate` (`symbol`, `saledate`),
+  ADD INDEX `idx_purchasedate_saledate` (`purchasedate`, `saledate`);
@@ -0,0 +1,163 @@
+from dotenv import load_dotenv
+load_dotenv()
+
+import os
+import csv
+import json
+import random
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import logsetup as ls
+import backtest
+import strategy
+
+
+sharedArrays = ['opens', 'closes', 'benchmark']
+
+workerState = {}
+
+
+def main():
+    try:
+        ls.log.info("OPTIMIZE BEGIN")
+
+        symbolList = os.getenv('TICKERS').split(',')
+        benchmarkSymbol = os.getenv('BENCHMARK_SYMBOL')
+        startDate = os.getenv('BACKTEST_START_DATE')
+        endDate = os.getenv('BACKTEST_END_DATE')
+
+        if os.getenv('BACKTEST_REFRESH_BARS') == 'True':
+            backtest.refreshBars(symbolList + [benchmarkSymbol], startDate, endDate)
+
+        priceData = backtest.loadPriceData(symbolList, benchmarkSymbol, startDate, endDate)
+        trials = getTrials(strategy.loadParameters())
+        results = runTrials(priceData, trials, float(os.getenv('BACKTEST_INITIAL_EQUITY')))
+        writeResults(results)
+
+        for result in results[:10]:
+            ls.log.info(result)
+            print(result)
+
+    except:
+        ls.log.exception("optimize.main")
+
+    finally:
+        ls.log.info("OPTIMIZE END")
+
+
+def getTrials(baseParameters):
+    try:
+        # OPTIMIZE_GRID maps parameter names from strategy.loadParameters to the values to try, e.g. {"rsiLower": [40, 45]}
+        grid = json.loads(os.getenv('OPTIMIZE_GRID'))
+        samples = int(os.getenv('OPTIMIZE_SAMPLES'))
+
+        names = list(grid.keys())
+        combinations = [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+        trials = [{**baseParameters, **combination} for combination in combinations]
+        trials = [trial for trial in trials if trial['rsiPeriodLower'] <= trial['rsiPeriodUpper'] and trial['rsiLower'] < trial['rsiUpper']]
+
+        # a positive sample count switches from the full grid to a seeded random search over it
+        if 0 < samples < len(trials):
+            trials = random.Random(int(os.getenv('OPTIMIZE_SEED'))).sample(trials, samples)
+
+        ls.log.info({'optimizeTrials': len(trials)})
+
+        return trials
+    except:
+        ls.log.exception("optimize.getTrials")
+
+
+def runTrials(priceData, trials, initialEquity):
+    try:
+        optimizeWorkers = int(os.getenv('OPTIMIZE_WORKERS')) or os.cpu_count()
+        sharedBlocks = []
+
+        try:
+            # price matrices are placed in shared memory once, workers map them instead of receiving a pickled copy per trial
+            arrayDescriptions = {}
+            for name in sharedArrays:
+                array = priceData[name]
+                sharedBlock = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+                np.ndarray(array.shape, dtype=array.dtype, buffer=sharedBlock.buf)[...] = array
+                sharedBlocks.append(sharedBlock)
+                arrayDescriptions[name] = (sharedBlock.name, array.shape, array.dtype.str)
+
+            initializerArguments = (arrayDescriptions, priceData['symbols'], priceData['dates'], initialEquity)
+
+            with ProcessPoolExecutor(optimizeWorkers, initializer=initializeWorker, initargs=initializerArguments) as pool:
+                results = [result for result in pool.map(runTrial, trials, chunksize=max(1, len(trials) // (optimizeWorkers * 4))) if result is not None]
+
+        finally:
+            for sharedBlock in sharedBlocks:
+                sharedBlock.close()
+                sharedBlock.unlink()
+
+        results.sort(key=lambda result: (result['oneYearPerformance'], result['oneYearVariance']), reverse=True)
+
+        return results
+    except:
+        ls.log.exception("optimize.runTrials")
+
+
+def initializeWorker(arrayDescriptions, symbols, dates, initialEquity):
+    try:
+        priceData = {'symbols': symbols, 'dates': dates}
+        sharedBlocks = []
+
+        for name, (blockName, shape, dtype) in arrayDescriptions.items():
+            sharedBlock = shared_memory.SharedMemory(name=blockName)
+            sharedBlocks.append(sharedBlock)
+            priceData[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=sharedBlock.buf)
+
+        workerState['priceData'] = priceData
+        workerState['sharedBlocks'] = sharedBlocks
+        workerState['initialEquity'] = initialEquity
+        workerState['evaluations'] = {}
+    except:
+        ls.log.exception("optimize.initializeWorker")
+
+
+def runTrial(parameters):
+    try:
+        priceData = workerState['priceData']
+        periodRange = (parameters['rsiPeriodLower'], parameters['rsiPeriodUpper'])
+
+        # rolling signals only depend on the period range, so trials that share it reuse them within a worker
+        if periodRange not in workerState['evaluations']:
+            workerState['evaluations'][periodRange] = backtest.precomputeEvaluations(priceData, list(range(periodRange[0], periodRange[1] + 1)))
+
+        result = backtest.runBacktest(priceData, parameters, workerState['initialEquity'], workerState['evaluations'][periodRange])
+        summary = backtest.summarizeBacktest(priceData, result)
+
+        return {**parameters, **summary}
+    except:
+        ls.log.exception("optimize.runTrial")
+
+
+def writeResults(results):
+    try:
+        resultsPath = os.getenv('OPTIMIZE_RESULTS_PATH')
+        resultsDirectory = os.path.dirname(resultsPath)
+        if resultsDirectory:
+            os.makedirs(resultsDirectory, exist_ok=True)
+
+        with open(resultsPath, 'w', newline='') as resultsFile:
+            writer = csv.DictWriter(resultsFile, fieldnames=['rank'] + list(results[0].keys()) if results else ['rank'])
+            writer.writeheader()
+            for rank, result in enumerate(results, start=1):
+                writer.writerow({'rank': rank, **result})
+    except:
+        ls.log.exception("optimize.writeResults")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except:
+        ls.log.exception("optimize")
+    finally:
+        quit()
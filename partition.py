@@ -0,0 +1,142 @@
+import hashlib
+import threading
+import logsetup as ls
+import settings
+
+from bisect import bisect
+from time import monotonic, sleep
+from multiprocessing.connection import Listener, Client, wait
+
+
+class HashRing:
+
+    __slots__ = ('points', 'nodes')
+
+    def __init__(self, nodeNames, virtualNodes):
+        # every node owns many points on the ring, so shards stay even and losing a node only moves that node's symbols
+        ring = sorted((getHash(nodeName + '#' + str(index)), nodeName) for nodeName in nodeNames for index in range(virtualNodes))
+        self.points = [point for point, nodeName in ring]
+        self.nodes = [nodeName for point, nodeName in ring]
+
+
+    def getNode(self, key):
+        return self.nodes[bisect(self.points, getHash(key)) % len(self.points)] if self.points else None
+
+
+    def partition(self, keys):
+        # keys keep their input order inside each shard, so every worker evaluates in TICKERS order
+        shards = {}
+        for key in keys:
+            shards.setdefault(self.getNode(key), []).append(key)
+        return shards
+
+
+def getHash(key):
+    # a stable digest rather than hash(), which is salted per process and would give every worker a different ring
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+def getAddress():
+    host, port = settings.getenv('PARTITION_ADDRESS').rsplit(':', 1)
+    return (host, int(port))
+
+
+def getAuthKey():
+    return settings.getenv('PARTITION_AUTH_KEY').encode()
+
+
+def openListener():
+    try:
+        return Listener(getAddress(), authkey=getAuthKey())
+    except:
+        ls.log.exception("partition.openListener")
+
+
+def connectToCoordinator(workerName, timeoutSeconds):
+    try:
+        # local workers can start before the coordinator is listening, so the first refusals are retried until the deadline
+        deadline = monotonic() + timeoutSeconds
+        while True:
+            try:
+                connection = Client(getAddress(), authkey=getAuthKey())
+                connection.send(('join', workerName))
+                return connection
+            except ConnectionRefusedError:
+                if monotonic() >= deadline:
+                    raise
+                sleep(0.5)
+    except:
+        ls.log.exception("partition.connectToCoordinator")
+
+
+def acceptWorkers(listener, workerCount, timeoutSeconds):
+    try:
+        # accept has no timeout of its own, so it runs on a daemon thread and the coordinator goes ahead with whoever joined in time
+        workers = {}
+        workersLock = threading.Lock()
+        allJoined = threading.Event()
+
+        def acceptLoop():
+            while True:
+                try:
+                    connection = listener.accept()
+                    message = connection.recv()
+                    with workersLock:
+                        if message[0] == 'join' and message[1] not in workers and not allJoined.is_set():
+                            workers[message[1]] = connection
+                            if len(workers) >= workerCount:
+                                allJoined.set()
+                        else:
+                            connection.close()
+                except OSError:
+                    # the listener was closed once the coordinator stopped waiting
+                    return
+                except:
+                    ls.log.exception("partition.acceptWorkers accept")
+
+        threading.Thread(target=acceptLoop, daemon=True).start()
+        allJoined.wait(timeoutSeconds)
+
+        with workersLock:
+            allJoined.set()
+            if len(workers) < workerCount:
+                ls.log.warning({'workersJoined': sorted(workers), 'workersExpected': workerCount})
+            return dict(workers)
+    except:
+        ls.log.exception("partition.acceptWorkers")
+        return {}
+
+
+def gatherResults(workers, timeoutSeconds):
+    try:
+        # results are read in whatever order workers finish, a worker that fails or misses the deadline is left out
+        results = {}
+        pending = {connection: workerName for workerName, connection in workers.items()}
+        deadline = monotonic() + timeoutSeconds
+
+        while pending and monotonic() < deadline:
+            for connection in wait(list(pending), max(0, deadline - monotonic())):
+                workerName = pending.pop(connection)
+                try:
+                    message = connection.recv()
+                    if message[0] == 'candidates':
+                        results[workerName] = message[1]
+                except (EOFError, OSError):
+                    ls.log.warning({'workerLost': workerName})
+
+        if pending:
+            ls.log.warning({'workersTimedOut': sorted(pending.values())})
+
+        return results
+    except:
+        ls.log.exception("partition.gatherResults")
+        return {}
+
+
+def stopWorkers(workers):
+    for workerName, connection in workers.items():
+        try:
+            connection.send(('stop',))
+            connection.close()
+        except:
+            ls.log.exception("partition.stopWorkers")
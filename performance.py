@@ -0,0 +1,168 @@
+import os
+import sqlite3
+import threading
+import logsetup as ls
+import settings
+import timekeeper as tk
+import api
+
+from datetime import datetime
+import pytz
+
+
+performanceStoreLock = threading.Lock()
+performanceStores = {}
+
+
+def getPerformanceStore():
+    # accounts usually share the base PERFORMANCE_STORE_PATH, so under an account the file is suffixed with its api key id
+    performanceStorePath = settings.getenv('PERFORMANCE_STORE_PATH')
+    if settings.accountName.get():
+        performanceStoreRoot, performanceStoreExtension = os.path.splitext(performanceStorePath)
+        performanceStorePath = performanceStoreRoot + '-' + api.getAccountCredentials()[0] + performanceStoreExtension
+
+    with performanceStoreLock:
+        if performanceStorePath not in performanceStores:
+            performanceStoreDirectory = os.path.dirname(performanceStorePath)
+            if performanceStoreDirectory:
+                os.makedirs(performanceStoreDirectory, exist_ok=True)
+
+            performanceStore = sqlite3.connect(performanceStorePath, check_same_thread=False)
+            # cumulativecashflow is the running total of deposits and withdrawals, so the flows inside any window are one subtraction
+            performanceStore.execute("CREATE TABLE IF NOT EXISTS daily (date TEXT PRIMARY KEY, equity REAL NOT NULL, benchmark REAL NOT NULL, cashflow REAL NOT NULL, cumulativecashflow REAL NOT NULL) WITHOUT ROWID")
+            performanceStore.commit()
+            performanceStores[performanceStorePath] = performanceStore
+
+        return performanceStores[performanceStorePath]
+
+
+def getLastRow(beforeDate):
+    try:
+        performanceStore = getPerformanceStore()
+        with performanceStoreLock:
+            return performanceStore.execute("SELECT date, equity, benchmark, cashflow, cumulativecashflow FROM daily WHERE date < ? ORDER BY date DESC LIMIT 1", (beforeDate,)).fetchone()
+    except:
+        ls.log.exception("performance.getLastRow")
+
+
+def getCashFlows(afterDate):
+    try:
+        cashFlows = {}
+        # withdrawals are negative, so deposits and withdrawals are both added here
+        for activity in api.getCashDeposits(afterDate) + api.getCashWithdrawals(afterDate):
+            activityDate = str(activity['date'])[:10]
+            cashFlows[activityDate] = cashFlows.get(activityDate, float(0)) + float(activity['net_amount'])
+        return cashFlows
+    except:
+        ls.log.exception("performance.getCashFlows")
+
+
+def update():
+    try:
+        # the newest completed session was last written by an intraday run, so it is fetched again and rewritten along with today
+        lastRow = getLastRow(tk.formattedDate)
+        anchorRow = getLastRow(lastRow[0]) if lastRow is not None else None
+        benchmarkSymbol = settings.getenv('BENCHMARK_SYMBOL')
+
+        if lastRow is None:
+            portfolioHistory = api.getPortfolioHistory(period=settings.getenv('PERFORMANCE_BACKFILL_PERIOD'))
+        else:
+            portfolioHistory = api.getPortfolioHistory(start=lastRow[0])
+
+        equitySeries = []
+        for timestamp, equity in zip(portfolioHistory['timestamp'], portfolioHistory['equity']):
+            sessionDate = tk.sessionDateString(datetime.fromtimestamp(timestamp, pytz.utc))
+            if equity is not None and float(equity) > 0 and (lastRow is None or sessionDate >= lastRow[0]):
+                equitySeries.append((sessionDate, float(equity)))
+
+        if not equitySeries:
+            return
+
+        # flows are looked up after the last final row, so a deposit posted after an earlier run today still lands on its day
+        firstDate = anchorRow[0] if anchorRow is not None else equitySeries[0][0]
+        cashFlows = getCashFlows(firstDate)
+        benchmarkBars = api.getStockBars([benchmarkSymbol], tk.stringToDate(firstDate), tk.nowMinus15Minutes)[benchmarkSymbol]
+        benchmarkCloses = {bar.date: float(bar.close) for bar in benchmarkBars}
+
+        benchmark = anchorRow[2] if anchorRow is not None else None
+        cumulativeCashFlow = anchorRow[4] if anchorRow is not None else float(0)
+        rows = []
+
+        for sessionDate, equity in equitySeries:
+            # the benchmark carries its last close over any session it has no bar for
+            benchmark = benchmarkCloses.get(sessionDate, benchmark)
+            if benchmark is None:
+                continue
+            # flows on the first backfilled day are already inside its equity
+            cashFlow = cashFlows.get(sessionDate, float(0)) if rows or anchorRow is not None else float(0)
+            cumulativeCashFlow += cashFlow
+            rows.append((sessionDate, equity, benchmark, cashFlow, cumulativeCashFlow))
+
+        performanceStore = getPerformanceStore()
+        with performanceStoreLock:
+            performanceStore.executemany("INSERT OR REPLACE INTO daily (date, equity, benchmark, cashflow, cumulativecashflow) VALUES (?, ?, ?, ?, ?)", rows)
+            performanceStore.commit()
+
+        ls.log.debug({'performanceRowsWritten': len(rows)})
+    except:
+        ls.log.exception("performance.update")
+
+
+def getDividendYield(symbol, price, startDate):
+    try:
+        dividendHistory = api.getDividendHistory(symbol)
+        periodDividend = 0
+        for dividendPayment in dividendHistory:
+            if startDate <= dividendPayment['paymentDate'] <= tk.formattedDate:
+                periodDividend += dividendPayment['dividend']
+        dividendYield = periodDividend / price
+        return dividendYield
+    except:
+        ls.log.exception("performance.getDividendYield")
+
+
+def getWindowReturns(startDate):
+    try:
+        performanceStore = getPerformanceStore()
+        with performanceStoreLock:
+            startRow = performanceStore.execute("SELECT date, equity, benchmark, cashflow, cumulativecashflow FROM daily WHERE date >= ? ORDER BY date LIMIT 1", (startDate,)).fetchone()
+            endRow = performanceStore.execute("SELECT date, equity, benchmark, cashflow, cumulativecashflow FROM daily ORDER BY date DESC LIMIT 1").fetchone()
+
+        if startRow is None or endRow is None:
+            return None
+
+        adjustedStartingEquity = startRow[1] + (endRow[4] - startRow[4])
+        returnPercentage = (endRow[1] - adjustedStartingEquity) / adjustedStartingEquity
+        benchmarkReturnPercentage = ((endRow[2] - startRow[2]) / startRow[2]) + getDividendYield(settings.getenv('BENCHMARK_SYMBOL'), endRow[2], startRow[0])
+
+        windowReturns = {
+                            'performance': float('%.6f' % returnPercentage),
+                            'benchmark': float('%.6f' % benchmarkReturnPercentage),
+                            'variance': float('%.6f' % (returnPercentage - benchmarkReturnPercentage))
+        }
+
+        return windowReturns
+    except:
+        ls.log.exception("performance.getWindowReturns")
+
+
+def getReport():
+    try:
+        windows = {
+                    'oneYear': tk.todayMinus1YearFormatted,
+                    'yearToDate': tk.yearStartFormatted,
+                    'thirtyDay': tk.todayMinus30DaysFormatted,
+                    'sinceInception': ''
+        }
+
+        report = {}
+        for name, startDate in windows.items():
+            windowReturns = getWindowReturns(startDate)
+            if windowReturns is not None:
+                report[name + 'Performance'] = windowReturns['performance']
+                report[name + 'Benchmark'] = windowReturns['benchmark']
+                report[name + 'Variance'] = windowReturns['variance']
+
+        return report
+    except:
+        ls.log.exception("performance.getReport")
@@ -0,0 +1,131 @@
+import uuid
+import logsetup as ls
+import timekeeper as tk
+import database as db
+import strategy
+
+
+class PositionBook:
+
+    def __init__(self):
+        try:
+            self.lotsBySymbol = {}
+            self.dayTradeCount = 0
+            self.pendingPurchases = []
+            self.pendingSplits = []
+            self.pendingSales = []
+            self.__load()
+
+            logData = {
+                        'openLots': sum(len(lots) for lots in self.lotsBySymbol.values()),
+                        'openSymbols': len(self.lotsBySymbol),
+                        'dayTradeCount': self.dayTradeCount
+            }
+
+            ls.log.info(logData)
+
+        except:
+            ls.log.exception("PositionBook.__init__")
+
+
+    def __load(self):
+        try:
+            # one round trip: the day trade count is joined onto every open lot, and still returned when there are none
+            query = (
+                        "SELECT daytrades.total, positions.id, positions.symbol, positions.quantity, positions.purchasedate, positions.purchaseprice"
+                        " FROM (SELECT COUNT(*) AS total FROM " + db.getTableName() + " WHERE purchasedate >= %s AND saledate >= %s AND purchasedate = saledate) AS daytrades"
+                        " LEFT JOIN " + db.getTableName() + " AS positions ON positions.openposition = 1"
+            )
+            records = db.runQueryAndReturnResults(query, (tk.todayMinus5DaysFormatted, tk.todayMinus5DaysFormatted))
+
+            for record in records:
+                self.dayTradeCount = record[0]
+                if record[1] is not None:
+                    # purchasedate is a DATE column, the sell logic compares it against formatted date strings
+                    self.lotsBySymbol.setdefault(record[2], []).append((record[1], record[2], record[3], str(record[4]), record[5]))
+        except:
+            ls.log.exception("PositionBook.__load")
+
+
+    def symbols(self):
+        try:
+            return list(self.lotsBySymbol.keys())
+        except:
+            ls.log.exception("PositionBook.symbols")
+
+
+    def lots(self, symbol):
+        try:
+            return list(self.lotsBySymbol.get(symbol, []))
+        except:
+            ls.log.exception("PositionBook.lots")
+
+
+    def costBasis(self, symbol):
+        try:
+            return sum(float(str(lot[2])) * float(lot[4]) for lot in self.lotsBySymbol.get(symbol, []))
+        except:
+            ls.log.exception("PositionBook.costBasis")
+
+
+    def dayTradeAllowed(self, pendingDayTrades=0):
+        try:
+            return strategy.dayTradeAllowed(self.dayTradeCount + pendingDayTrades)
+        except:
+            ls.log.exception("PositionBook.dayTradeAllowed")
+
+
+    def recordSale(self, tableRecordID, salePrice, sellOrderID, quantity=None):
+        try:
+            for symbol, lots in self.lotsBySymbol.items():
+                for index, lot in enumerate(lots):
+                    if lot[0] == tableRecordID:
+                        self.dayTradeCount += 1 if lot[3] == tk.formattedDate else 0
+                        remainingQuantity = float(str(lot[2])) - float(quantity) if quantity is not None else 0
+
+                        # a partial fill splits the lot, the sold part becomes its own closed record and the rest stays open
+                        if remainingQuantity > 0:
+                            soldRecordID = str(uuid.uuid4())
+                            lots[index] = (lot[0], lot[1], remainingQuantity, lot[3], lot[4])
+                            self.pendingSplits.append((soldRecordID, quantity, tableRecordID))
+                            self.pendingSales.append((tk.formattedDate, salePrice, sellOrderID, soldRecordID))
+                            return
+
+                        lots.remove(lot)
+                        self.pendingSales.append((tk.formattedDate, salePrice, sellOrderID, tableRecordID))
+                        if not lots:
+                            del self.lotsBySymbol[symbol]
+                        return
+        except:
+            ls.log.exception("PositionBook.recordSale")
+
+
+    def recordPurchase(self, symbol, quantity, purchasePrice, purchaseOrderID):
+        try:
+            tableRecordID = str(uuid.uuid4())
+            self.lotsBySymbol.setdefault(symbol, []).append((tableRecordID, symbol, quantity, tk.formattedDate, purchasePrice))
+            self.pendingPurchases.append((tableRecordID, symbol, quantity, tk.formattedDate, purchasePrice, purchaseOrderID))
+        except:
+            ls.log.exception("PositionBook.recordPurchase")
+
+
+    def flush(self):
+        try:
+            if not (self.pendingPurchases or self.pendingSplits or self.pendingSales):
+                return
+
+            insertQuery = "INSERT INTO " + db.getTableName() + " (id, symbol, quantity, purchasedate, purchaseprice, purchaseorderid) VALUES (%s, %s, %s, %s, %s, %s)"
+            splitInsertQuery = (
+                                    "INSERT INTO " + db.getTableName() + " (id, symbol, quantity, purchasedate, purchaseprice, purchaseorderid)"
+                                    " SELECT %s, symbol, %s, purchasedate, purchaseprice, purchaseorderid FROM " + db.getTableName() + " WHERE id = %s"
+            )
+            splitUpdateQuery = "UPDATE " + db.getTableName() + " SET quantity = quantity - %s WHERE id = %s"
+            updateQuery = "UPDATE " + db.getTableName() + " SET saledate = %s, saleprice = %s, saleorderid = %s WHERE id = %s"
+
+            # pending writes are kept on failure so a later flush can retry them
+            if db.runBatch([(insertQuery, self.pendingPurchases), (splitInsertQuery, self.pendingSplits), (splitUpdateQuery, [(quantity, tableRecordID) for soldRecordID, quantity, tableRecordID in self.pendingSplits]), (updateQuery, self.pendingSales)]):
+                self.pendingPurchases = []
+                self.pendingSplits = []
+                self.pendingSales = []
+        except:
+            ls.log.exception("PositionBook.flush")
@@ -0,0 +1,70 @@
+import os
+import pickle
+import sqlite3
+import threading
+import logsetup as ls
+
+from time import time
+
+
+try:
+    refCachePath = os.getenv('REFERENCE_CACHE_PATH')
+    refCacheDirectory = os.path.dirname(refCachePath)
+    if refCacheDirectory:
+        os.makedirs(refCacheDirectory, exist_ok=True)
+
+    refCacheLock = threading.Lock()
+    refCache = sqlite3.connect(refCachePath, check_same_thread=False)
+    refCache.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL) WITHOUT ROWID")
+    refCache.execute("DELETE FROM entries WHERE expires <= ?", (time(),))
+    refCache.commit()
+
+    # entries read or written this process are also kept in memory, so repeat lookups skip sqlite and unpickling
+    memoryEntries = {}
+except:
+    ls.log.error("Error opening reference cache, quitting program.")
+    ls.log.exception("refcache")
+    quit()
+
+
+def getEntry(key):
+    try:
+        with refCacheLock:
+            entry = memoryEntries.get(key)
+            if entry is None:
+                row = refCache.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    entry = memoryEntries[key] = (pickle.loads(row[0]), row[1])
+
+            if entry is not None and entry[1] > time():
+                return entry[0]
+            return None
+    except:
+        ls.log.exception("refcache.getEntry")
+
+
+def setEntry(key, value, ttlSeconds):
+    try:
+        with refCacheLock:
+            expires = time() + ttlSeconds
+            memoryEntries[key] = (value, expires)
+            refCache.execute("INSERT OR REPLACE INTO entries (key, value, expires) VALUES (?, ?, ?)", (key, pickle.dumps(value), expires))
+            refCache.commit()
+    except:
+        ls.log.exception("refcache.setEntry")
+
+
+def getOrFetch(key, ttlSetting, fetch):
+    try:
+        value = getEntry(key)
+        if value is not None:
+            ls.log.debug({'refCacheHit': key})
+            return value
+
+        # failed fetches come back as None and are not cached, so the next call tries the api again
+        value = fetch()
+        if value is not None:
+            setEntry(key, value, float(os.getenv(ttlSetting)))
+        return value
+    except:
+        ls.log.exception("refcache.getOrFetch")
@@ -0,0 +1,43 @@
+import os
+import contextvars
+
+from dotenv import dotenv_values
+
+
+# values from an account env file shadow the process environment for code running in that account's context
+accountName = contextvars.ContextVar('accountName', default='')
+accountSettings = contextvars.ContextVar('accountSettings', default={})
+
+
+def getenv(name, default=None):
+    value = accountSettings.get().get(name)
+    return value if value is not None else os.getenv(name, default)
+
+
+def loadAccounts():
+    # ACCOUNT_ENV_FILES lists one env file per account, each only needs the settings that differ from the base .env
+    accounts = []
+    for accountEnvFile in os.getenv('ACCOUNT_ENV_FILES', '').split(','):
+        if accountEnvFile.strip():
+            name = os.path.splitext(os.path.basename(accountEnvFile.strip()))[0]
+            accounts.append((name, dotenv_values(accountEnvFile.strip())))
+    return accounts
+
+
+def runAs(name, overrides, function, *args):
+    def runInAccount():
+        accountName.set(name)
+        accountSettings.set(overrides)
+        return function(*args)
+
+    return contextvars.copy_context().run(runInAccount)
+
+
+def propagate(function):
+    # worker threads start from an empty context, this carries the caller's account over to every call
+    context = contextvars.copy_context()
+
+    def runInCallerContext(*args):
+        return context.copy().run(function, *args)
+
+    return runInCallerContext
@@ -0,0 +1,159 @@
+import numpy as np
+import logsetup as ls
+
+
+def buildPriceMatrix(barsData, symbols, atTheOpen, currentPrices=None):
+    try:
+        # rows are right aligned on the most recent bar, shorter histories are padded with nan on the left
+        sessions = max([len(barsData.get(symbol, [])) for symbol in symbols] + [0])
+        priceMatrix = np.full((len(symbols), sessions), np.nan)
+
+        for row, symbol in enumerate(symbols):
+            prices = [bar.open if atTheOpen else bar.close for bar in barsData.get(symbol, [])]
+            if prices:
+                priceMatrix[row, sessions - len(prices):] = prices
+
+        # the live price stands in for the still forming current bar
+        if currentPrices is not None and sessions > 0:
+            priceMatrix[:, -1] = currentPrices
+
+        return priceMatrix
+    except:
+        ls.log.exception("signals.buildPriceMatrix")
+
+
+def computeRsi(priceMatrix, periods):
+    try:
+        differences = np.diff(priceMatrix, axis=1)
+        missing = np.isnan(differences)
+        gains = np.where(missing, np.nan, np.where(differences > 0, differences, 0.0))
+        losses = np.where(missing, np.nan, np.where(differences < 0, -differences, 0.0))
+
+        # summed from the most recent difference backwards, the same order as the per-symbol loop it replaces
+        gainSums = np.cumsum(gains[:, ::-1], axis=1)
+        lossSums = np.cumsum(losses[:, ::-1], axis=1)
+
+        rsiMatrix = np.full((priceMatrix.shape[0], len(periods)), np.nan)
+
+        for column, period in enumerate(periods):
+            if period < 1 or period > differences.shape[1]:
+                continue
+
+            averageGain = gainSums[:, period - 1] / period
+            averageLoss = lossSums[:, period - 1] / period
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rs = averageGain / averageLoss
+                rsiMatrix[:, column] = np.where(averageLoss != 0, 100 - 100 / (1 + rs), 100.0)
+
+            rsiMatrix[np.isnan(averageLoss), column] = np.nan
+
+        return roundLikeFormat(rsiMatrix, 3)
+    except:
+        ls.log.exception("signals.computeRsi")
+
+
+def computePercentUpDown(priceMatrix):
+    try:
+        if priceMatrix.shape[1] < 2:
+            return np.full(priceMatrix.shape[0], np.nan)
+
+        previousPrices = priceMatrix[:, -2]
+        currentPrices = priceMatrix[:, -1]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percentUpDown = (currentPrices - previousPrices) / previousPrices
+
+        return roundLikeFormat(percentUpDown, 6)
+    except:
+        ls.log.exception("signals.computePercentUpDown")
+
+
+def computeSignals(barsData, symbols, currentPrices, atTheOpen, periods, rsiLower=None, rsiUpper=None):
+    try:
+        priceMatrix = buildPriceMatrix(barsData, symbols, atTheOpen, currentPrices)
+        rsiMatrix = computeRsi(priceMatrix, periods)
+        percentUpDown = computePercentUpDown(priceMatrix)
+
+        signals = {
+                    'symbols': list(symbols),
+                    'periods': list(periods),
+                    'rsi': rsiMatrix,
+                    'percentUpDown': percentUpDown
+        }
+
+        # the masks are only built for callers that pass thresholds, the live path applies strategy conditions per lot instead
+        if rsiLower is not None:
+            signals['buy'] = (percentUpDown[:, None] <= 0) & (rsiMatrix <= rsiLower)
+        if rsiUpper is not None:
+            signals['sell'] = (percentUpDown[:, None] > 0) & (rsiMatrix >= rsiUpper)
+
+        return signals
+    except:
+        ls.log.exception("signals.computeSignals")
+
+
+def computeRollingRsi(priceMatrix, periods):
+    try:
+        # rsiTensor[k, symbol, t] is the rsi for periods[k] with session t's price as the current price
+        differences = np.diff(priceMatrix, axis=1, prepend=np.nan)
+        valid = ~np.isnan(differences)
+        gains = np.where(valid & (differences > 0), differences, 0.0)
+        losses = np.where(valid & (differences < 0), -differences, 0.0)
+
+        leadingZeros = np.zeros((priceMatrix.shape[0], 1))
+        gainTotals = np.concatenate([leadingZeros, np.cumsum(gains, axis=1)], axis=1)
+        lossTotals = np.concatenate([leadingZeros, np.cumsum(losses, axis=1)], axis=1)
+        validTotals = np.concatenate([leadingZeros, np.cumsum(valid, axis=1)], axis=1)
+
+        sessions = priceMatrix.shape[1]
+        rsiTensor = np.full((len(periods), priceMatrix.shape[0], sessions), np.nan)
+
+        for index, period in enumerate(periods):
+            if period < 1 or period > sessions:
+                continue
+
+            gainSums = gainTotals[:, period:] - gainTotals[:, :-period]
+            lossSums = lossTotals[:, period:] - lossTotals[:, :-period]
+            validCounts = validTotals[:, period:] - validTotals[:, :-period]
+
+            # differences of running totals leave float dust where the window is flat
+            gainSums[np.abs(gainSums) < 1e-9] = 0.0
+            lossSums[np.abs(lossSums) < 1e-9] = 0.0
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rsi = np.where(lossSums != 0, 100 - 100 / (1 + gainSums / lossSums), 100.0)
+
+            rsi[validCounts < period] = np.nan
+            rsiTensor[index, :, period - 1:] = rsi
+
+        return np.round(rsiTensor, 3)
+    except:
+        ls.log.exception("signals.computeRollingRsi")
+
+
+def computeRollingPercentUpDown(priceMatrix):
+    try:
+        previousPrices = np.concatenate([np.full((priceMatrix.shape[0], 1), np.nan), priceMatrix[:, :-1]], axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            percentUpDown = (priceMatrix - previousPrices) / previousPrices
+
+        return np.round(percentUpDown, 6)
+    except:
+        ls.log.exception("signals.computeRollingPercentUpDown")
+
+
+def roundLikeFormat(values, digits):
+    try:
+        # np.round can land on the other side of a tie than '%.nf' formatting does, so ties are re-rounded in python
+        rounded = np.round(values, digits)
+        scaled = np.abs(values * 10 ** digits)
+        nearTie = np.isfinite(scaled) & (np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+
+        for index in zip(*np.nonzero(nearTie)):
+            rounded[index] = float('%.*f' % (digits, values[index]))
+
+        return rounded
+    except:
+        ls.log.exception("signals.roundLikeFormat")
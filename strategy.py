@@ -0,0 +1,140 @@
+import numpy as np
+import logsetup as ls
+import settings
+
+
+dayTradeLimit = 3
+
+
+def loadParameters():
+    try:
+        parameters = {
+                        'enduranceDays': int(settings.getenv('ENDURANCE_DAYS')),
+                        'activeMarginPercentage': float(settings.getenv('ACTIVE_MARGIN_PERCENTAGE')),
+                        'rsiPeriodLower': int(settings.getenv('RSI_PERIOD_LOWER')),
+                        'rsiPeriodUpper': int(settings.getenv('RSI_PERIOD_UPPER')),
+                        'rsiLower': int(settings.getenv('RSI_LOWER')),
+                        'rsiUpper': int(settings.getenv('RSI_UPPER')),
+                        'sellSideMarginMinimum': float(settings.getenv('SELL_SIDE_MARGIN_MINIMUM')),
+                        'marginInterestRate': float(settings.getenv('MARGIN_INTEREST_RATE')),
+                        'limitBuffer': float(settings.getenv('LIMIT_BUFFER')),
+                        'spreadLimit': float(settings.getenv('SPREAD_LIMIT'))
+        }
+        return parameters
+    except:
+        ls.log.exception("strategy.loadParameters")
+
+
+def selectRsiPeriods(equity, longMarketValue, parameters):
+    try:
+        activeCapital = equity * (1 + parameters['activeMarginPercentage'])
+        capitalUtilization = longMarketValue / activeCapital
+
+        rsiPeriodLower = parameters['rsiPeriodLower']
+        rsiPeriodUpper = parameters['rsiPeriodUpper']
+
+        if rsiPeriodLower > rsiPeriodUpper:
+            raise Exception("RSI period lower must be less than or equal to RSI period upper.")
+
+        rsiRange = range(rsiPeriodLower, rsiPeriodUpper + 1)
+        rsiRangeLength = len(rsiRange)
+
+        utzSegmentSize = 1 / rsiRangeLength
+        currentUtzTestValue = utzSegmentSize
+        
+        buyRSI = rsiPeriodUpper
+        sellRSI = rsiPeriodLower
+
+        for i in range(rsiRangeLength):
+            if capitalUtilization <= currentUtzTestValue:
+                
+                buyRSI = rsiRange[i]                
+                sellRSI = rsiRange[rsiRangeLength - 1 - i]
+                
+                break
+
+            currentUtzTestValue = currentUtzTestValue + utzSegmentSize
+        
+        rsiDictionary = {'buy': buyRSI, 'sell': sellRSI}
+        
+        return rsiDictionary
+    except:
+        ls.log.exception("strategy.selectRsiPeriods")
+
+
+def allocateBuyOrders(limitPrices, rsiValues, equity, longMarketValue, cash, parameters):
+    try:
+        limitPrices = np.asarray(limitPrices, dtype=float)
+        activeMarginPercentage = parameters['activeMarginPercentage']
+        activeCapital = equity * (1 + activeMarginPercentage)
+        theoreticalOrderCost = activeCapital / parameters['enduranceDays']
+        activeBuyingPower = activeCapital - longMarketValue
+
+        # each candidate gets one endurance slice, sized against one account snapshot
+        orderQuantities = np.floor(theoreticalOrderCost / limitPrices)
+
+        # slices keep being handed out while buying power remains, the most oversold candidates first instead of whichever come first in TICKERS
+        affordableOrders = int(np.ceil(activeBuyingPower / theoreticalOrderCost)) if activeBuyingPower > 0 else 0
+        rankedIndexes = np.argsort(np.asarray(rsiValues, dtype=float), kind='stable')
+        selected = np.zeros(len(limitPrices), dtype=bool)
+        selected[rankedIndexes[:affordableOrders]] = True
+
+        # without margin cash has to cover each order's estimated cost, spent down in rank order as if the orders went out one by one
+        if activeMarginPercentage <= 0:
+            remainingCash = cash
+            for index in rankedIndexes:
+                estimatedOrderCost = orderQuantities[index] * limitPrices[index]
+                if selected[index] and estimatedOrderCost <= remainingCash:
+                    remainingCash -= estimatedOrderCost
+                else:
+                    selected[index] = False
+
+        orderQuantities = np.where(selected, orderQuantities, 0)
+
+        ls.log.debug(
+                        {
+                            'equity': equity,
+                            'longMarketValue': longMarketValue,
+                            'activeMarginPercentage': activeMarginPercentage,
+                            'activeCapital': activeCapital,
+                            'theoreticalOrderCost': theoreticalOrderCost,
+                            'activeBuyingPower': activeBuyingPower,
+                            'candidates': len(limitPrices),
+                            'affordableOrders': affordableOrders
+                        }
+                    )
+
+        return [int(orderQuantity) for orderQuantity in orderQuantities]
+    except:
+        ls.log.exception("strategy.allocateBuyOrders")
+
+
+def buyConditionsMet(percentUpDown, rsi, parameters):
+    try:
+        return percentUpDown <= 0 and rsi <= parameters['rsiLower']
+    except:
+        ls.log.exception("strategy.buyConditionsMet")
+
+
+def dayTradeAllowed(dayTradeCount):
+    try:
+        return dayTradeCount <= dayTradeLimit
+    except:
+        ls.log.exception("strategy.dayTradeAllowed")
+
+
+def sellConditionsMet(percentUpDown, rsi, limitPriceSell, purchasePrice, daysHeld, boughtToday, cash, parameters):
+    try:
+        marginInterestCoverage = 0 if cash >= 0 else daysHeld * (parameters['marginInterestRate'] / 360)
+
+        percentUpDownCondition = percentUpDown > 0
+        rsiSellCondition = rsi >= parameters['rsiUpper']
+        profitMarginSellCondition = ((limitPriceSell / purchasePrice) - 1) >= (parameters['sellSideMarginMinimum'] + marginInterestCoverage)
+
+        standardSellScenario = percentUpDownCondition and profitMarginSellCondition and rsiSellCondition
+        dayTradeSellScenario = boughtToday and profitMarginSellCondition
+        negativeCashSellScenario = cash <= 0 and profitMarginSellCondition
+
+        return standardSellScenario or dayTradeSellScenario or negativeCashSellScenario
+    except:
+        ls.log.exception("strategy.sellConditionsMet")
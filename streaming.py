@@ -0,0 +1,148 @@
+import queue
+import threading
+import logsetup as ls
+import timekeeper as tk
+import strategy
+
+
+class SignalState:
+
+    __slots__ = ('period', 'basePrice', 'gainSum', 'lossSum', 'rsi', 'percentUpDown')
+
+    def __init__(self, prices, period):
+        # prices are completed session prices, the live trade price stands in for the current session as in Asset
+        self.period = period
+        self.basePrice = prices[len(prices) - 1] if prices else None
+        self.gainSum = float(0)
+        self.lossSum = float(0)
+        self.rsi = None
+        self.percentUpDown = None
+
+        # the rsi window is the last period - 1 completed differences plus the live one, so only the live one changes per trade
+        if period < 1 or len(prices) < period:
+            self.basePrice = None
+            return
+
+        for index in range(len(prices) - period + 1, len(prices)):
+            difference = prices[index] - prices[index - 1]
+            if difference > 0:
+                self.gainSum += difference
+            elif difference < 0:
+                self.lossSum -= difference
+
+
+    def update(self, price):
+        if self.basePrice is None:
+            return False
+
+        difference = price - self.basePrice
+        gainSum = self.gainSum + (difference if difference > 0 else 0)
+        lossSum = self.lossSum - (difference if difference < 0 else 0)
+
+        self.rsi = float('%.3f' % (100 - 100 / (1 + gainSum / lossSum))) if lossSum != 0 else float(100)
+        self.percentUpDown = float('%.6f' % (difference / self.basePrice))
+        return True
+
+
+class StreamingEvaluator:
+
+    def __init__(self, barsData, rsiPeriods, parameters):
+        try:
+            self.parameters = parameters
+            self.lock = threading.Lock()
+            self.triggers = queue.SimpleQueue()
+            self.sessionPrices = {symbol: [bar.close for bar in bars if bar.date < tk.formattedDate] for symbol, bars in barsData.items()}
+            self.buyStates = {}
+            self.sellStates = {}
+            self.rsiPeriods = {}
+            self.buyActive = set()
+            self.sellActive = set()
+            self.lots = {}
+            self.cash = float(0)
+            self.setRsiPeriods(rsiPeriods)
+        except:
+            ls.log.exception("StreamingEvaluator.__init__")
+
+
+    def setRsiPeriods(self, rsiPeriods):
+        try:
+            # rebuilding a state is a short loop over its window, so it only happens when capital utilization moves the periods
+            buyStates = self.buyStates
+            sellStates = self.sellStates
+            if rsiPeriods['buy'] != self.rsiPeriods.get('buy'):
+                buyStates = {symbol: SignalState(prices, rsiPeriods['buy']) for symbol, prices in self.sessionPrices.items()}
+            if rsiPeriods['sell'] != self.rsiPeriods.get('sell'):
+                sellStates = {symbol: SignalState(prices, rsiPeriods['sell']) for symbol, prices in self.sessionPrices.items()}
+
+            # states are built outside the lock and swapped in, so the websocket thread only waits for the assignment
+            with self.lock:
+                self.buyStates = buyStates
+                self.sellStates = sellStates
+                self.rsiPeriods = {'buy': rsiPeriods['buy'], 'sell': rsiPeriods['sell']}
+        except:
+            ls.log.exception("StreamingEvaluator.setRsiPeriods")
+
+
+    def setPositions(self, positionBook, cash):
+        try:
+            # the websocket thread reads its own copy of the lots, the position book itself stays on the main thread
+            lots = {}
+            for symbol in positionBook.symbols():
+                lots[symbol] = [(float(lot[4]), tk.dateDiff(tk.stringToDate(lot[3]), tk.currentDate), lot[3] == tk.formattedDate) for lot in positionBook.lots(symbol)]
+
+            with self.lock:
+                self.lots = lots
+                self.cash = cash
+        except:
+            ls.log.exception("StreamingEvaluator.setPositions")
+
+
+    def onTrade(self, symbol, price):
+        try:
+            with self.lock:
+                buyState = self.buyStates.get(symbol)
+                sellState = self.sellStates.get(symbol)
+
+                if buyState is not None and buyState.update(price):
+                    buyCondition = strategy.buyConditionsMet(buyState.percentUpDown, buyState.rsi, self.parameters)
+                    self.__edgeTrigger(self.buyActive, 'buy', symbol, buyCondition)
+
+                if sellState is not None and symbol in self.lots and sellState.update(price):
+                    limitPriceSell = float('%.2f' % (price * (1 - self.parameters['limitBuffer'])))
+                    sellCondition = any(
+                                        strategy.sellConditionsMet(sellState.percentUpDown, sellState.rsi, limitPriceSell, purchasePrice, daysHeld, boughtToday, self.cash, self.parameters)
+                                        for purchasePrice, daysHeld, boughtToday in self.lots[symbol]
+                    )
+                    self.__edgeTrigger(self.sellActive, 'sell', symbol, sellCondition)
+        except:
+            ls.log.exception("StreamingEvaluator.onTrade")
+
+
+    def __edgeTrigger(self, activeSymbols, side, symbol, condition):
+        # a trigger fires when the condition crosses into true, and rearms once it has been false again
+        if condition and symbol not in activeSymbols:
+            activeSymbols.add(symbol)
+            self.triggers.put((side, symbol))
+            ls.log.debug({'streamTrigger': side, 'symbol': symbol})
+        elif not condition:
+            activeSymbols.discard(symbol)
+
+
+    def takeTriggers(self, timeoutSeconds):
+        try:
+            # waits for the first trigger, then drains whatever else arrived so one batch is sized and submitted together
+            triggered = {'buy': [], 'sell': []}
+            try:
+                side, symbol = self.triggers.get(timeout=timeoutSeconds)
+            except queue.Empty:
+                return triggered
+
+            while True:
+                if symbol not in triggered[side]:
+                    triggered[side].append(symbol)
+                try:
+                    side, symbol = self.triggers.get_nowait()
+                except queue.Empty:
+                    return triggered
+        except:
+            ls.log.exception("StreamingEvaluator.takeTriggers")
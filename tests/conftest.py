@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+from dotenv import load_dotenv
+
+
+repoRoot = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repoRoot)
+
+# modules read their settings and open their files at import, so logs and local stores go to a scratch directory first
+testDirectory = tempfile.mkdtemp(prefix='alpha-tests-')
+os.environ.setdefault('LOG_FILE_PREFIX', 'tests')
+os.environ.setdefault('LOG_DIRECTORY', os.path.join(testDirectory, 'logs'))
+os.environ.setdefault('BAR_STORE_PATH', os.path.join(testDirectory, 'bars.db'))
+os.environ.setdefault('REFERENCE_CACHE_PATH', os.path.join(testDirectory, 'reference.db'))
+os.environ.setdefault('PERFORMANCE_STORE_PATH', os.path.join(testDirectory, 'performance.db'))
+load_dotenv(os.path.join(repoRoot, '.env.template'))
@@ -0,0 +1,87 @@
+import random
+
+from collections import namedtuple
+
+import signals
+
+
+Bar = namedtuple('Bar', ['date', 'open', 'high', 'low', 'close', 'volume'])
+
+
+def loopRsi(bars, currentPrice, rsiPeriod, atTheOpen):
+    # the per-symbol loop Asset used before the vectorized kernel
+    gain = 0
+    loss = 0
+
+    for i in range(rsiPeriod):
+        first = bars[len(bars)-2-i].open if atTheOpen else bars[len(bars)-2-i].close
+
+        if i == 0:
+            second = currentPrice
+        elif atTheOpen and i != 0:
+            second = bars[len(bars)-1-i].open
+        else:
+            second = bars[len(bars)-1-i].close
+
+        if first<second:
+            gain = gain + abs(second-first)
+        if first>second:
+            loss = loss + abs(second-first)
+
+    averageGain = gain / rsiPeriod
+    averageLoss = loss / rsiPeriod
+
+    if averageLoss != 0:
+        rs = averageGain / averageLoss
+        rsi = 100 - 100 / (1 + rs)
+    else:
+        rsi = 100
+
+    return float('%.3f' % rsi)
+
+
+def loopPercentUpDown(bars, currentPrice, atTheOpen):
+    previousPrice = bars[len(bars)-2].open if atTheOpen else bars[len(bars)-2].close
+    return float('%.6f' % ((currentPrice - previousPrice) / previousPrice))
+
+
+def randomBars(generator, sessions):
+    bars = []
+    price = generator.uniform(5, 500)
+    for session in range(sessions):
+        # cent prices with repeats, so flat sessions and rounding ties both come up
+        openPrice = round(max(0.01, price + generator.choice([-1, 0, 0, 1]) * generator.uniform(0, 2)), 2)
+        price = round(max(0.01, openPrice + generator.choice([-1, 0, 1]) * generator.uniform(0, 3)), 2)
+        bars.append(Bar('2024-01-%02d' % (session % 28 + 1), openPrice, max(openPrice, price), min(openPrice, price), price, 1000))
+    return bars
+
+
+def test_computeSignalsMatchesLoop():
+    generator = random.Random(8)
+    mismatches = []
+
+    for case in range(300):
+        rsiPeriod = generator.randint(1, 20)
+        atTheOpen = generator.random() < 0.5
+        symbols = ['S' + str(index) for index in range(10)]
+        barsData = {symbol: randomBars(generator, generator.randint(rsiPeriod + 1, rsiPeriod + 30)) for symbol in symbols}
+        currentPrices = [round(barsData[symbol][-1].close + generator.uniform(-2, 2), 2) for symbol in symbols]
+
+        computed = signals.computeSignals(barsData, symbols, currentPrices, atTheOpen, [rsiPeriod])
+
+        for row, symbol in enumerate(symbols):
+            expected = (loopRsi(barsData[symbol], currentPrices[row], rsiPeriod, atTheOpen), loopPercentUpDown(barsData[symbol], currentPrices[row], atTheOpen))
+            actual = (float(computed['rsi'][row, 0]), float(computed['percentUpDown'][row]))
+            if actual != expected:
+                mismatches.append((case, symbol, expected, actual))
+
+    assert mismatches == []
+
+
+def test_computeSignalsShortHistoryIsNan():
+    bars = randomBars(random.Random(1), 5)
+    computed = signals.computeSignals({'A': bars}, ['A', 'B'], [10.0, 10.0], False, [10])
+
+    assert computed['rsi'][0, 0] != computed['rsi'][0, 0]
+    assert computed['rsi'][1, 0] != computed['rsi'][1, 0]
+    assert 'buy' not in computed and 'sell' not in computed
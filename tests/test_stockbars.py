@@ -0,0 +1,86 @@
+import sqlite3
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import api
+import barstore
+import timekeeper as tk
+
+
+def makeBar(date):
+    day = int(date[8:10])
+    return barstore.Bar(date, float(day), float(day) + 1, float(day) - 1, float(day) + 0.5, 1000.0)
+
+
+@pytest.fixture
+def fetchCalls(monkeypatch):
+    calls = []
+
+    def fetchStockBars(symbols, startDate, endDate):
+        calls.append((list(symbols), tk.sessionDateString(startDate)))
+        dates = []
+        date = startDate
+        while date <= endDate:
+            dates.append(tk.sessionDateString(date))
+            date += timedelta(days=1)
+        return {symbol: [makeBar(date) for date in dates] for symbol in symbols}
+
+    with barstore.barStoreLock:
+        barstore.barStore.execute("DELETE FROM bars")
+        barstore.barStore.execute("DELETE FROM coverage")
+        barstore.barStore.commit()
+
+    monkeypatch.setattr(api, 'fetchStockBars', fetchStockBars)
+    monkeypatch.setattr(tk, 'formattedDate', '2024-03-15')
+    return calls
+
+
+def dates(bars):
+    return [bar.date for bar in bars]
+
+
+def test_uncoveredSymbolIsFetchedAndStored(fetchCalls):
+    barsData = api.getStockBars(['AAA'], datetime(2024, 3, 1), datetime(2024, 3, 15, 12))
+
+    assert fetchCalls == [(['AAA'], '2024-03-01')]
+    assert dates(barsData['AAA']) == ['2024-03-%02d' % day for day in range(1, 16)]
+    assert barstore.getCoverage(['AAA'])['AAA'] == ('2024-03-01', '2024-03-14')
+
+
+def test_coveredSymbolOnlyFetchesNewSessions(fetchCalls, monkeypatch):
+    api.getStockBars(['AAA'], datetime(2024, 3, 1), datetime(2024, 3, 15, 12))
+
+    monkeypatch.setattr(tk, 'formattedDate', '2024-03-18')
+    barsData = api.getStockBars(['AAA'], datetime(2024, 3, 1), datetime(2024, 3, 18, 12))
+
+    assert fetchCalls[1] == (['AAA'], '2024-03-15')
+    assert dates(barsData['AAA']) == ['2024-03-%02d' % day for day in range(1, 19)]
+    assert barstore.getCoverage(['AAA'])['AAA'] == ('2024-03-01', '2024-03-17')
+
+
+def test_earlierStartRefetchesWholeRange(fetchCalls):
+    api.getStockBars(['AAA'], datetime(2024, 3, 10), datetime(2024, 3, 15, 12))
+    barsData = api.getStockBars(['AAA', 'BBB'], datetime(2024, 3, 5), datetime(2024, 3, 15, 12))
+
+    assert fetchCalls[1] == (['AAA', 'BBB'], '2024-03-05')
+    assert dates(barsData['AAA']) == ['2024-03-%02d' % day for day in range(5, 16)]
+    assert barstore.getCoverage(['AAA'])['AAA'] == ('2024-03-05', '2024-03-14')
+
+
+def test_lockedStoreStillReturnsFetchedSessions(fetchCalls):
+    # another process sharing BAR_STORE_PATH holds the write lock for the whole call
+    blocker = sqlite3.connect(barstore.barStorePath, isolation_level=None)
+    barstore.barStore.execute("PRAGMA busy_timeout = 0")
+    blocker.execute("BEGIN IMMEDIATE")
+
+    try:
+        barsData = api.getStockBars(['AAA'], datetime(2024, 3, 1), datetime(2024, 3, 15, 12))
+    finally:
+        blocker.execute("ROLLBACK")
+        blocker.close()
+        barstore.barStore.execute("PRAGMA busy_timeout = 5000")
+
+    assert dates(barsData['AAA']) == ['2024-03-%02d' % day for day in range(1, 16)]
+    assert barstore.getCoverage(['AAA']) == {}
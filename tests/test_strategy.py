@@ -0,0 +1,36 @@
+import strategy
+
+
+def allocate(limitPrices, rsiValues, equity, longMarketValue, cash, activeMarginPercentage, enduranceDays=10):
+    parameters = {'activeMarginPercentage': activeMarginPercentage, 'enduranceDays': enduranceDays}
+    return strategy.allocateBuyOrders(limitPrices, rsiValues, equity, longMarketValue, cash, parameters)
+
+
+def test_everyCandidateGetsASliceWhenBuyingPowerAllows():
+    # slice 2000 at 10x equity of 20000, nothing held yet
+    assert allocate([100.0, 150.0, 30.0], [25.0, 20.0, 28.0], 20000, 0, 20000, 0) == [20, 13, 66]
+
+
+def test_mostOversoldCandidatesWinWhenSlicesRunOut():
+    # 4500 of buying power left is three slices, started while power remains as the per-order rule did
+    assert allocate([100.0, 100.0, 100.0, 100.0, 100.0], [30.0, 10.0, 25.0, 10.0, 20.0], 20000, 15500, 20000, 0) == [0, 20, 0, 20, 20]
+
+
+def test_marginExtendsBuyingPowerWithoutACashCap():
+    # 50% margin makes 30000 of active capital, slices of 3000 are not limited by cash
+    assert allocate([100.0, 100.0], [20.0, 30.0], 20000, 0, 500, 0.5) == [30, 30]
+
+
+def test_noBuyingPowerBuysNothing():
+    assert allocate([100.0, 100.0], [20.0, 30.0], 20000, 25000, 20000, 0.25) == [0, 0]
+
+
+def test_withoutMarginCashCoversTheActualOrderCost():
+    # a 2000 slice buys 13 shares at 150 for 1950, which 1990 of cash covers even though it is short of a whole slice
+    assert allocate([150.0], [20.0], 20000, 0, 1990, 0) == [13]
+
+
+def test_withoutMarginCashIsSpentDownInRankOrder():
+    # 1980 leaves 1020 of 3000, so the 1950 order no longer fits but a later 1001 one still does
+    assert allocate([150.0, 99.0, 50.0], [25.0, 15.0, 28.0], 20000, 0, 3000, 0) == [0, 20, 0]
+    assert allocate([150.0, 99.0, 1001.0], [25.0, 15.0, 28.0], 20000, 0, 3000, 0) == [0, 20, 1]
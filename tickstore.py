@@ -0,0 +1,135 @@
+import os
+import threading
+import logsetup as ls
+
+from array import array
+
+
+class TickRing:
+
+    __slots__ = ('lock', 'depth', 'bids', 'asks', 'quoteTimes', 'quoteCount', 'prices', 'sizes', 'tradeTimes', 'tradeCount')
+
+    def __init__(self, depth):
+        # fixed size float arrays, written in place, so a tick costs no allocation and a symbol never grows past its depth
+        self.lock = threading.Lock()
+        self.depth = depth
+        self.bids = array('d', bytes(8 * depth))
+        self.asks = array('d', bytes(8 * depth))
+        self.quoteTimes = array('d', bytes(8 * depth))
+        self.quoteCount = 0
+        self.prices = array('d', bytes(8 * depth))
+        self.sizes = array('d', bytes(8 * depth))
+        self.tradeTimes = array('d', bytes(8 * depth))
+        self.tradeCount = 0
+
+
+    def recent(self, values, count, ticks):
+        # oldest first, at most ticks entries and never more than the ring holds
+        ticks = min(ticks, count, self.depth)
+        return [values[index % self.depth] for index in range(count - ticks, count)]
+
+
+try:
+    tickStoreDepth = int(os.getenv('TICK_STORE_DEPTH'))
+    tickRingsLock = threading.Lock()
+    tickRings = {}
+except:
+    ls.log.error("Error initializing tick store, quitting program.")
+    ls.log.exception("tickstore")
+    quit()
+
+
+def getRing(symbol):
+    ring = tickRings.get(symbol)
+    if ring is None:
+        with tickRingsLock:
+            ring = tickRings.setdefault(symbol, TickRing(tickStoreDepth))
+    return ring
+
+
+def recordQuote(symbol, bidPrice, askPrice, timestamp):
+    try:
+        ring = getRing(symbol)
+        with ring.lock:
+            index = ring.quoteCount % ring.depth
+            ring.bids[index] = bidPrice
+            ring.asks[index] = askPrice
+            ring.quoteTimes[index] = timestamp
+            ring.quoteCount += 1
+    except:
+        ls.log.exception("tickstore.recordQuote")
+
+
+def recordTrade(symbol, price, size, timestamp):
+    try:
+        ring = getRing(symbol)
+        with ring.lock:
+            index = ring.tradeCount % ring.depth
+            ring.prices[index] = price
+            ring.sizes[index] = size
+            ring.tradeTimes[index] = timestamp
+            ring.tradeCount += 1
+    except:
+        ls.log.exception("tickstore.recordTrade")
+
+
+def getLatestQuote(symbol):
+    try:
+        ring = tickRings.get(symbol)
+        if ring is None:
+            return None
+        with ring.lock:
+            if ring.quoteCount == 0:
+                return None
+            index = (ring.quoteCount - 1) % ring.depth
+            return (ring.bids[index], ring.asks[index])
+    except:
+        ls.log.exception("tickstore.getLatestQuote")
+
+
+def getLatestTradePrice(symbol):
+    try:
+        ring = tickRings.get(symbol)
+        if ring is None:
+            return None
+        with ring.lock:
+            if ring.tradeCount == 0:
+                return None
+            return ring.prices[(ring.tradeCount - 1) % ring.depth]
+    except:
+        ls.log.exception("tickstore.getLatestTradePrice")
+
+
+def getSpreadHistory(symbol, ticks):
+    try:
+        ring = tickRings.get(symbol)
+        if ring is None:
+            return []
+        with ring.lock:
+            bids = ring.recent(ring.bids, ring.quoteCount, ticks)
+            asks = ring.recent(ring.asks, ring.quoteCount, ticks)
+        return [abs((ask / bid) - 1) for bid, ask in zip(bids, asks) if bid != 0]
+    except:
+        ls.log.exception("tickstore.getSpreadHistory")
+
+
+def getVwap(symbol, ticks):
+    try:
+        ring = tickRings.get(symbol)
+        if ring is None:
+            return None
+        with ring.lock:
+            prices = ring.recent(ring.prices, ring.tradeCount, ticks)
+            sizes = ring.recent(ring.sizes, ring.tradeCount, ticks)
+        totalSize = sum(sizes)
+        return sum(price * size for price, size in zip(prices, sizes)) / totalSize if totalSize > 0 else None
+    except:
+        ls.log.exception("tickstore.getVwap")
+
+
+def clear(symbol):
+    try:
+        with tickRingsLock:
+            tickRings.pop(symbol, None)
+    except:
+        ls.log.exception("tickstore.clear")
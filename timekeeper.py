@@ -5,37 +5,62 @@ import pytz
 import logsetup as ls
 
 
-try:
-    currentDateTime = datetime.now(pytz.timezone('America/New_York'))
-    currentDate = currentDateTime.today()
-    nowMinus15Minutes = currentDateTime - timedelta(minutes=15)
-    todayMinus30Days = currentDateTime - timedelta(days=30)
-    todayMinus5Days = currentDateTime - timedelta(days=5)
-    todayMinus5DaysFormatted = todayMinus5Days.strftime("%Y-%m-%d")
-    todayMinus1Year = currentDateTime - relativedelta(years=1)
-    todayMinus1YearFormatted = todayMinus1Year.strftime("%Y-%m-%d")
-    todayMinus1YearPlus2Days = todayMinus1Year + timedelta(days=2)
-    todayMinus1YearPlus2DaysFormatted = todayMinus1YearPlus2Days.strftime("%Y-%m-%d")
-    formattedDate = currentDateTime.strftime("%Y-%m-%d")
-    yearMonthString = currentDateTime.strftime("%Y_%m")
-    currentTime = currentDateTime.strftime("%H:%M")
-    weekDay = currentDateTime.weekday()
-    hour = currentDateTime.hour
-
-
-    def stringToDate(dateString):
-        try:
-            return datetime.strptime(dateString, "%Y-%m-%d")
-        except:
-            ls.log.exception("timekeeper.stringToDate")
-
-
-    def dateDiff(date1, date2):
-        try:
-            return abs((date2-date1).days)
-        except:
-            ls.log.exception("timekeeper.dateDiff")
-
-            
-except:
-    ls.log.exception("timekeeper")
\ No newline at end of file
+def refresh():
+    try:
+        global currentDateTime, currentDate, nowMinus15Minutes, todayMinus30Days, todayMinus30DaysFormatted, todayMinus5Days, todayMinus5DaysFormatted
+        global todayMinus1Year, todayMinus1YearFormatted, todayMinus1YearPlus2Days, todayMinus1YearPlus2DaysFormatted
+        global formattedDate, yearStartFormatted, yearMonthString, currentTime, weekDay, hour
+
+        currentDateTime = datetime.now(pytz.timezone('America/New_York'))
+        currentDate = currentDateTime.today()
+        nowMinus15Minutes = currentDateTime - timedelta(minutes=15)
+        todayMinus30Days = currentDateTime - timedelta(days=30)
+        todayMinus30DaysFormatted = todayMinus30Days.strftime("%Y-%m-%d")
+        todayMinus5Days = currentDateTime - timedelta(days=5)
+        todayMinus5DaysFormatted = todayMinus5Days.strftime("%Y-%m-%d")
+        todayMinus1Year = currentDateTime - relativedelta(years=1)
+        todayMinus1YearFormatted = todayMinus1Year.strftime("%Y-%m-%d")
+        todayMinus1YearPlus2Days = todayMinus1Year + timedelta(days=2)
+        todayMinus1YearPlus2DaysFormatted = todayMinus1YearPlus2Days.strftime("%Y-%m-%d")
+        formattedDate = currentDateTime.strftime("%Y-%m-%d")
+        yearStartFormatted = currentDateTime.strftime("%Y-01-01")
+        yearMonthString = currentDateTime.strftime("%Y_%m")
+        currentTime = currentDateTime.strftime("%H:%M")
+        weekDay = currentDateTime.weekday()
+        hour = currentDateTime.hour
+    except:
+        ls.log.exception("timekeeper.refresh")
+
+
+def stringToDate(dateString):
+    try:
+        return datetime.strptime(dateString, "%Y-%m-%d")
+    except:
+        ls.log.exception("timekeeper.stringToDate")
+
+
+def sessionDateString(dateTime):
+    try:
+        # aware datetimes are converted to exchange time first so a 04:00 UTC bar stamp lands on its session date
+        if dateTime.tzinfo is not None:
+            dateTime = dateTime.astimezone(pytz.timezone('America/New_York'))
+        return dateTime.strftime("%Y-%m-%d")
+    except:
+        ls.log.exception("timekeeper.sessionDateString")
+
+
+def shiftDateString(dateString, days):
+    try:
+        return (datetime.strptime(dateString, "%Y-%m-%d") + timedelta(days=days)).strftime("%Y-%m-%d")
+    except:
+        ls.log.exception("timekeeper.shiftDateString")
+
+
+def dateDiff(date1, date2):
+    try:
+        return abs((date2-date1).days)
+    except:
+        ls.log.exception("timekeeper.dateDiff")
+
+
+refresh()